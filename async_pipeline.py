@@ -0,0 +1,169 @@
+import os
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from report_utils import AttendancePDFReader, is_pdf_path, source_name
+from report_writer import AttendancePDFWriter
+from main import extract_report, apply_rules
+from batch import output_name, list_reports
+from metrics import PipelineMetrics, stage_timer
+
+def _write_file(path: str, data: bytes) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def _scan_pages(reader: AttendancePDFReader) -> dict[int, str]:
+    reader.open()
+    return reader.pages_needing_ocr()
+
+def _store_ocr_results(reader: AttendancePDFReader, results: dict, pending: dict[int, str]) -> None:
+    for i, result in results.items():
+        if result is None:
+            reader.store_ocr_result(i, None, pending[i])
+        else:
+            text, seconds, renders = result
+            reader.store_ocr_result(i, text, pending[i], seconds, renders)
+
+def _read_texts(reader: AttendancePDFReader, layout: bool = False) -> tuple[str, str, list | None]:
+    try:
+        return (reader.extract_text_first_page(), reader.extract_text_all_pages(),
+                reader.extract_words_all_pages() if layout else None)
+    finally:
+        reader.close()
+
+def _draw_pdf(df_var, report_type: str, header_flags: dict, metrics: PipelineMetrics | None = None) -> bytes:
+    return AttendancePDFWriter(metrics=metrics).to_bytes(df_var, report_type, header_flags)
+
+def _in_stage(metrics: PipelineMetrics | None, name: str, func, *args):
+    with stage_timer(metrics, name):
+        return func(*args)
+
+class AsyncReportProcessor:
+    def __init__(self, max_concurrency: int = 2, ocr_workers: int = 1, ocr_timeout: float | None = None,
+                 cache=None, cpu_executor=None, ocr_executor=None, queue_size: int | None = None,
+                 adaptive_ocr: bool = False, layout: bool = False):
+        self.max_concurrency = max(1, max_concurrency)
+        self.ocr_timeout = ocr_timeout
+        self.adaptive_ocr = adaptive_ocr
+        self.layout = layout
+        self.cache = cache
+        self.queue_size = queue_size or self.max_concurrency * 2
+        self._own_cpu = cpu_executor is None
+        self._own_ocr = ocr_executor is None
+        self.cpu_executor = cpu_executor or ThreadPoolExecutor(max_workers=self.max_concurrency)
+        self.ocr_executor = ocr_executor or ProcessPoolExecutor(max_workers=max(1, ocr_workers))
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._own_cpu:
+            await asyncio.to_thread(self.cpu_executor.shutdown)
+        if self._own_ocr:
+            await asyncio.to_thread(self.ocr_executor.shutdown)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.cpu_executor, func, *args)
+
+    async def _ocr_page(self, reader: AttendancePDFReader, page_num: int) -> tuple[str, float, list] | None:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.ocr_executor, *reader.ocr_job(page_num))
+        except Exception:
+            return None
+
+    async def process_report(self, input_pdf, output_pdf, metrics: PipelineMetrics | None = None) -> int:
+        async with self._slots:
+            name = source_name(input_pdf)
+            print(f"Processing: {name}")
+            reader = AttendancePDFReader(input_pdf, ocr_timeout=self.ocr_timeout, cache=self.cache, metrics=metrics,
+                                         adaptive_ocr=self.adaptive_ocr)
+            try:
+                pending = await self._run(_in_stage, metrics, "scan", _scan_pages, reader)
+                if pending:
+                    with stage_timer(metrics, "ocr"):
+                        results = await asyncio.gather(*(self._ocr_page(reader, i) for i in pending))
+                    await self._run(_store_ocr_results, reader, dict(zip(pending, results)), pending)
+                first_page_text, all_pages_text, pages_words = await self._run(_in_stage, metrics, "read",
+                                                                               _read_texts, reader, self.layout)
+            finally:
+                reader.close()
+
+            extracted = await self._run(extract_report, name, first_page_text, all_pages_text, metrics,
+                                        pages_words)
+            if extracted is None:
+                return 0
+            df, report_type, header_flags = extracted
+
+            df_var = await self._run(apply_rules, name, df, report_type, None, metrics)
+            if df_var is None:
+                return 0
+
+            pdf_bytes = await self._run(_in_stage, metrics, "write", _draw_pdf, df_var, report_type, header_flags,
+                                        metrics)
+        if is_pdf_path(output_pdf):
+            await asyncio.to_thread(_write_file, output_pdf, pdf_bytes)
+        else:
+            output_pdf.write(pdf_bytes)
+        print(f"Successfully created: {source_name(output_pdf)}")
+        return len(df_var)
+
+    async def _run_one(self, in_file: str, out_file: str) -> dict:
+        started = time.perf_counter()
+        result = {"input": in_file, "output": out_file, "status": "ok", "rows": 0, "error": None}
+        try:
+            rows = await self.process_report(in_file, out_file)
+            result["rows"] = rows
+            if not rows:
+                result["status"] = "empty"
+                result["output"] = None
+        except Exception as e:
+            result["status"] = "failed"
+            result["output"] = None
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        return result
+
+    async def process_many(self, jobs) -> list[dict]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        results: dict[int, dict] = {}
+
+        async def consume():
+            while True:
+                item = await queue.get()
+                try:
+                    if item is None:
+                        return
+                    idx, in_file, out_file = item
+                    results[idx] = await self._run_one(in_file, out_file)
+                finally:
+                    queue.task_done()
+
+        consumers = [asyncio.create_task(consume()) for _ in range(self.max_concurrency)]
+        try:
+            for idx, (in_file, out_file) in enumerate(jobs):
+                await queue.put((idx, in_file, out_file))
+            for _ in consumers:
+                await queue.put(None)
+            await asyncio.gather(*consumers)
+        finally:
+            for task in consumers:
+                task.cancel()
+        return [results[i] for i in sorted(results)]
+
+    async def process_directory(self, input_dir: str, output_dir: str) -> list[dict]:
+        names = await asyncio.to_thread(list_reports, input_dir)
+        return await self.process_many(
+            (os.path.join(input_dir, f), os.path.join(output_dir, output_name(f))) for f in names
+        )
+
+async def process_report_async(input_pdf, output_pdf, **options) -> int:
+    async with AsyncReportProcessor(**options) as processor:
+        return await processor.process_report(input_pdf, output_pdf)
@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import traceback
+import zlib
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from metrics import PipelineMetrics, append_json_log, write_prometheus, make_metrics
+from manifest import ReportManifest, MANIFEST_NAME
+from ledger import WorkLedger, write_json, DEFAULT_MAX_ATTEMPTS, DEFAULT_STALE_AFTER
+from report_utils import ocr_backend
+
+MANIFEST_SAVE_EVERY = 50
+
+def output_name(fname: str) -> str:
+    return fname.replace('.pdf', '_variation.pdf')
+
+def list_reports(input_dir: str) -> list[str]:
+    return sorted(f for f in os.listdir(input_dir) if f.lower().endswith('.pdf'))
+
+def _warm_worker():
+    import fitz
+    import rules
+    from report_utils import warm_ocr_engine
+    from report_writer import preload_fonts
+    preload_fonts()
+    warm_ocr_engine()
+
+def _run_one(in_file: str, out_file: str, report_options: dict, collect_metrics: bool = False,
+             profile: dict | None = None) -> dict:
+    from main import process_report
+
+    started = time.perf_counter()
+    result = {"input": in_file, "output": out_file, "status": "ok", "rows": 0, "error": None}
+    metrics = make_metrics(in_file, True, profile)
+    try:
+        rows = process_report(in_file, out_file, metrics=metrics, **report_options)
+        result["rows"] = rows
+        ocr_failed = int(metrics.counters.get("pages_ocr_failed", 0))
+        if ocr_failed:
+            result["ocr_failed"] = ocr_failed
+        if not rows:
+            result["status"] = "failed" if ocr_failed else "empty"
+            result["output"] = None
+            if ocr_failed:
+                result["error"] = f"OCR failed on {ocr_failed} pages"
+    except Exception as e:
+        result["status"] = "failed"
+        result["output"] = None
+        result["error"] = f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    if collect_metrics:
+        result["metrics"] = metrics.as_dict()
+    return result
+
+def _crashed_result(in_file: str, out_file: str) -> dict:
+    return {"input": in_file, "output": None, "status": "failed", "rows": 0,
+            "error": "worker process died while processing this report", "seconds": 0.0}
+
+def _run_isolated(in_file: str, out_file: str, report_options: dict, collect_metrics: bool,
+                  profile: dict | None) -> dict:
+    with ProcessPoolExecutor(max_workers=1, initializer=_warm_worker) as solo:
+        try:
+            return solo.submit(_run_one, in_file, out_file, report_options, collect_metrics, profile).result()
+        except BrokenProcessPool:
+            return _crashed_result(in_file, out_file)
+
+def _process_jobs(jobs, workers: int, max_pending: int | None, report_options: dict, collect_metrics: bool,
+                  finished, profile: dict | None = None) -> int:
+    count = 0
+    if workers <= 1:
+        for in_file, out_file in jobs:
+            finished(_run_one(in_file, out_file, report_options, collect_metrics, profile))
+            count += 1
+        return count
+    max_pending = max_pending or workers * 2
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker)
+    pending: dict = {}
+    crashed: list[tuple[str, str]] = []
+
+    def collect(done) -> bool:
+        for fut in done:
+            job = pending.pop(fut)
+            try:
+                finished(fut.result())
+            except BrokenProcessPool:
+                crashed.append(job)
+        return bool(crashed)
+
+    def restart():
+        nonlocal pool
+        collect(wait(pending)[0])
+        print(f"Warning: A worker process died, restarting the pool of {workers} workers")
+        pool.shutdown(wait=False, cancel_futures=True)
+        if len(crashed) == 1:
+            finished(_crashed_result(*crashed[0]))
+        else:
+            for job in crashed:
+                finished(_run_isolated(*job, report_options, collect_metrics, profile))
+        crashed.clear()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker)
+
+    def submit(in_file, out_file):
+        pending[pool.submit(_run_one, in_file, out_file, report_options, collect_metrics, profile)] = (
+            in_file, out_file)
+
+    try:
+        for in_file, out_file in jobs:
+            if len(pending) >= max_pending and collect(wait(pending, return_when=FIRST_COMPLETED)[0]):
+                restart()
+            try:
+                submit(in_file, out_file)
+            except BrokenProcessPool:
+                restart()
+                submit(in_file, out_file)
+            count += 1
+        if collect(wait(pending)[0]):
+            restart()
+    finally:
+        pool.shutdown()
+    return count
+
+def _export_metrics(results: list[dict], input_dir: str, metrics_log: str | None, prometheus_path: str | None,
+                    documents: int, failed: int, profile_path: str | None = None) -> None:
+    per_file = [r["metrics"] for r in results if "metrics" in r]
+    if profile_path:
+        from profiling import write_profile_report
+        write_profile_report(profile_path, per_file)
+    if metrics_log:
+        append_json_log(metrics_log, per_file)
+    if prometheus_path:
+        total = PipelineMetrics(input_dir)
+        for data in per_file:
+            total.merge(data)
+        total.incr("documents", documents)
+        total.incr("documents_failed", failed)
+        write_prometheus(prometheus_path, total)
+
+def run_batch(input_dir: str, output_dir: str, workers: int = 1, max_pending: int | None = None,
+              summary_path: str | None = None, metrics_log: str | None = None,
+              prometheus_path: str | None = None, force: bool = False, manifest_path: str | None = None,
+              profile_path: str | None = None, profile_cpu: bool = False, profile_memory: bool = False,
+              **report_options) -> dict:
+    os.makedirs(output_dir, exist_ok=True)
+    names = list_reports(input_dir)
+    manifest = ReportManifest(manifest_path or os.path.join(output_dir, MANIFEST_NAME), {
+        "adaptive_ocr": bool(report_options.get("adaptive_ocr")),
+        "layout": bool(report_options.get("layout")),
+        "ocr_backend": ocr_backend(),
+    })
+    started = time.perf_counter()
+    jobs = []
+    skipped: list[dict] = []
+    for f in names:
+        in_file, out_file = os.path.join(input_dir, f), os.path.join(output_dir, output_name(f))
+        if not force and manifest.is_current(f, in_file, out_file):
+            entry = manifest.entries[f]
+            skipped.append({"input": in_file, "output": out_file if entry["status"] == "ok" else None,
+                            "status": "skipped", "rows": entry["rows"], "error": None, "seconds": 0.0})
+        else:
+            jobs.append((in_file, out_file))
+    if skipped:
+        print(f"Skipping {len(skipped)} unchanged reports (use --force to reprocess)")
+
+    results: list[dict] = []
+    collect_metrics = bool(metrics_log or prometheus_path or profile_path)
+    profile = {"cpu": profile_cpu, "memory": profile_memory} if profile_path else None
+
+    def finished(result):
+        results.append(result)
+        manifest.record(os.path.basename(result["input"]), result["input"], result)
+        if len(results) % MANIFEST_SAVE_EVERY == 0:
+            manifest.save()
+
+    try:
+        _process_jobs(jobs, workers, max_pending, report_options, collect_metrics, finished, profile)
+    finally:
+        manifest.save(keep=set(names))
+    results.extend(skipped)
+    order = {os.path.join(input_dir, f): i for i, f in enumerate(names)}
+    results.sort(key=lambda r: order[r["input"]])
+
+    summary = {
+        "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "input_dir": input_dir,
+        "output_dir": output_dir,
+        "workers": workers,
+        "seconds": round(time.perf_counter() - started, 3),
+        "total": len(results),
+        "ok": sum(1 for r in results if r["status"] == "ok"),
+        "empty": sum(1 for r in results if r["status"] == "empty"),
+        "failed": sum(1 for r in results if r["status"] == "failed"),
+        "skipped": len(skipped),
+        "rows": sum(r["rows"] for r in results),
+        "files": results,
+    }
+    summary_path = summary_path or os.path.join(output_dir, "batch_summary.json")
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    if collect_metrics:
+        _export_metrics(results, input_dir, metrics_log, prometheus_path, len(results) - len(skipped),
+                        summary["failed"], profile_path)
+    print(f"Batch done: {summary['ok']} ok, {summary['empty']} empty, {summary['failed']} failed, "
+          f"{summary['skipped']} skipped "
+          f"in {summary['seconds']:.1f}s (summary: {summary_path})")
+    return summary
+
+def run_sharded(input_dir: str, output_dir: str, ledger_dir: str, workers: int = 1, max_pending: int | None = None,
+                summary_path: str | None = None, metrics_log: str | None = None,
+                prometheus_path: str | None = None, worker_id: str | None = None,
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS, stale_after: float = DEFAULT_STALE_AFTER,
+                poll_interval: float = 5.0, profile_path: str | None = None, profile_cpu: bool = False,
+                profile_memory: bool = False, **report_options) -> dict:
+    os.makedirs(output_dir, exist_ok=True)
+    names = list_reports(input_dir)
+    started = time.perf_counter()
+    started_at = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+    collect_metrics = bool(metrics_log or prometheus_path or profile_path)
+    profile = {"cpu": profile_cpu, "memory": profile_memory} if profile_path else None
+    results: list[dict] = []
+
+    with WorkLedger(ledger_dir, worker_id, stale_after, max_attempts) as ledger:
+        first = zlib.crc32(ledger.worker_id.encode('utf-8')) % len(names) if names else 0
+        order = names[first:] + names[:first]
+
+        def claimed_jobs():
+            for f in order:
+                in_file = os.path.join(input_dir, f)
+                if ledger.is_done(f, in_file) or not ledger.claim(f):
+                    continue
+                if ledger.done_entry(f) is not None:
+                    if ledger.is_done(f, in_file):
+                        ledger.release(f)
+                        continue
+                    ledger.reset(f)
+                attempts = ledger.attempts(f)
+                if attempts >= ledger.max_attempts:
+                    ledger.mark_done(f, in_file, {"input": in_file, "output": None, "status": "failed", "rows": 0,
+                                                  "error": f"gave up after {attempts} attempts", "seconds": 0.0})
+                    ledger.release(f)
+                    continue
+                yield in_file, os.path.join(output_dir, output_name(f))
+
+        def finished(result):
+            name = os.path.basename(result["input"])
+            result["worker"] = ledger.worker_id
+            retry = result["status"] == "failed" or result.get("ocr_failed")
+            error = result["error"] or f"OCR failed on {result.get('ocr_failed')} pages"
+            if retry and ledger.record_failure(name, error) < ledger.max_attempts:
+                result["status"] = "retry"
+            else:
+                ledger.mark_done(name, result["input"], result)
+            ledger.release(name)
+            results.append(result)
+
+        while True:
+            processed = _process_jobs(claimed_jobs(), workers, max_pending, report_options, collect_metrics,
+                                      finished, profile)
+            remaining = [f for f in names if not ledger.is_done(f, os.path.join(input_dir, f))]
+            if not remaining:
+                break
+            if not processed:
+                print(f"Waiting for {len(remaining)} reports claimed by other workers")
+                time.sleep(poll_interval)
+
+        shard = {
+            "worker": ledger.worker_id,
+            "started_at": started_at,
+            "finished_at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "seconds": round(time.perf_counter() - started, 3),
+            "processed": sum(1 for r in results if r["status"] != "retry"),
+            "retries": sum(1 for r in results if r["status"] == "retry"),
+            "rows": sum(r["rows"] for r in results),
+            "files": [{k: v for k, v in r.items() if k != "metrics"} for r in results],
+        }
+        ledger.save_summary(shard)
+        entries = [e for e in (ledger.done_entry(f) for f in names) if e is not None]
+        shards = ledger.shard_summaries(since=started_at)
+
+    summary = {
+        "finished_at": shard["finished_at"],
+        "input_dir": input_dir,
+        "output_dir": output_dir,
+        "ledger_dir": ledger_dir,
+        "shards": [{k: s[k] for k in ("worker", "seconds", "processed", "retries", "rows")} for s in shards],
+        "total": len(entries),
+        "ok": sum(1 for e in entries if e["status"] == "ok"),
+        "empty": sum(1 for e in entries if e["status"] == "empty"),
+        "failed": sum(1 for e in entries if e["status"] == "failed"),
+        "rows": sum(e["rows"] for e in entries),
+        "files": entries,
+    }
+    summary_path = summary_path or os.path.join(output_dir, "batch_summary.json")
+    write_json(summary_path, summary)
+    if collect_metrics:
+        _export_metrics(results, input_dir, metrics_log, prometheus_path, shard["processed"],
+                        sum(1 for r in results if r["status"] == "failed"), profile_path)
+    print(f"Shard {ledger.worker_id} done: {shard['processed']} reports ({shard['retries']} retried) "
+          f"in {shard['seconds']:.1f}s; all shards: {summary['ok']} ok, {summary['empty']} empty, "
+          f"{summary['failed']} failed (summary: {summary_path})")
+    return summary
@@ -0,0 +1,91 @@
+import os
+import re
+import sys
+import timeit
+import argparse
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from report_utils import AttendancePDFReader, match_date, match_times
+
+def legacy_find_date(line: str) -> str | None:
+    match = re.search(r'(\d{1,2})[/\-.](\d{1,2})[/\-.](\d{2,4})', line)
+    if not match: return None
+    try:
+        d, m, y = int(match.group(1)), int(match.group(2)), int(match.group(3))
+        if y < 100: y += 2000
+        return datetime(y, m, d).strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+def legacy_find_times(line: str) -> list[str]:
+    line = line.translate(str.maketrans({'O': '0', 'o': '0', 'l': '1', 'I': '1', 'S': '5', 'B': '8'}))
+    clean = re.sub(r"[^0-9:\./\-\s]", " ", line)
+    matches = re.findall(r"\b(\d{1,2})[:.：](\d{2})\b", clean)
+    out = [f"{int(h):02d}:{int(m):02d}" for h, m in matches if 0 <= int(h) <= 23 and 0 <= int(m) <= 59]
+    potential_times = re.findall(r"(?<![\d/\-])(\d{3,4})(?![\d/\-])", clean)
+    for token in potential_times:
+        try:
+            h, m = (int(token[:2]), int(token[2:])) if len(token) == 4 else (int(token[0]), int(token[1:]))
+            if 0 <= h <= 23 and 0 <= m <= 59:
+                formatted = f"{h:02d}:{m:02d}"
+                if formatted not in out: out.append(formatted)
+        except ValueError:
+            continue
+    return sorted(list(set(out)))
+
+def synthetic_lines(n: int) -> list[str]:
+    templates = [
+        "{d:02d}/{m:02d}/2024 יום {w} 08:{mm:02d} 17:{mm:02d} 0030",
+        "{d}.{m}.24 O8:3O l7:45",
+        "סה\"כ שעות {h}.{mm:02d} הערות",
+        "Attendance report page {d}",
+        "{h:02d}{mm:02d} {h:02d}:{mm:02d}",
+    ]
+    return [
+        templates[i % len(templates)].format(d=i % 28 + 1, m=i % 12 + 1, w=i % 7, mm=i % 60, h=i % 24)
+        for i in range(n)
+    ]
+
+def sample_lines(input_dir: str) -> list[str]:
+    lines: list[str] = []
+    for fname in sorted(os.listdir(input_dir)):
+        if not fname.lower().endswith('.pdf'):
+            continue
+        with AttendancePDFReader(os.path.join(input_dir, fname)) as reader:
+            lines.extend(reader.extract_text_all_pages().splitlines())
+    return lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the compiled date/time matchers with the previous implementation")
+    parser.add_argument("--input-dir", default=os.path.join(ROOT, "input_reports"))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-lines", type=int, default=2000,
+                        help="pad with synthetic lines when the samples yield fewer lines (e.g. no Tesseract)")
+    args = parser.parse_args(argv)
+
+    lines = sample_lines(args.input_dir)
+    print(f"{len(lines)} lines extracted from {args.input_dir}")
+    if len(lines) < args.min_lines:
+        lines += synthetic_lines(args.min_lines - len(lines))
+        print(f"padded to {len(lines)} lines with synthetic rows")
+
+    for line in lines:
+        found = match_date(line)
+        assert (found[0] if found else None) == legacy_find_date(line), line
+        assert [t for t, _, _ in match_times(line)] == legacy_find_times(line), line
+
+    cases = [
+        ("dates", lambda: [legacy_find_date(l) for l in lines], lambda: [match_date(l) for l in lines]),
+        ("times", lambda: [legacy_find_times(l) for l in lines], lambda: [match_times(l) for l in lines]),
+    ]
+    print(f"{'case':<8}{'legacy ms':>12}{'compiled ms':>14}{'speedup':>10}")
+    for name, legacy, compiled in cases:
+        t_legacy = min(timeit.repeat(legacy, number=1, repeat=args.repeat)) * 1000
+        t_compiled = min(timeit.repeat(compiled, number=1, repeat=args.repeat)) * 1000
+        print(f"{name:<8}{t_legacy:>12.2f}{t_compiled:>14.2f}{t_legacy / t_compiled:>9.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import io
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from itertools import product
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from report_utils import AttendancePDFReader, AttendanceTableExtractor, configure_tesseract
+from rules import AttendanceVariationRules
+from report_writer import AttendancePDFWriter
+from metrics import PipelineMetrics, stage_timer
+from synthetic_reports import generate_report
+
+STAGES = ("read", "extract", "rules", "write")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "pipeline.json")
+
+def scenario_name(report_type: str, days: int, image_ratio: float, noise: float) -> str:
+    return f"{report_type}-d{days}-img{image_ratio:g}-n{noise:g}"
+
+def run_pipeline(path: str, metrics: PipelineMetrics, adaptive_ocr: bool = False, layout: bool = False) -> int:
+    with stage_timer(metrics, "read"), AttendancePDFReader(path, metrics=metrics, adaptive_ocr=adaptive_ocr) as reader:
+        first_page_text = reader.extract_text_first_page()
+        all_pages_text = reader.extract_text_all_pages()
+        pages_words = reader.extract_words_all_pages() if layout else None
+    with stage_timer(metrics, "extract"):
+        extractor = AttendanceTableExtractor()
+        tokens = extractor.tokenize(all_pages_text)
+        df = extractor.extract_layout_records(pages_words) if pages_words else None
+        if df is None:
+            df = extractor.extract_records(tokens)
+        report_type = extractor.detect_report_type(tokens)
+        header_flags = extractor.detect_columns(first_page_text)
+    if df.empty:
+        return 0
+    with stage_timer(metrics, "rules"):
+        df_var, _ = AttendanceVariationRules(metrics).apply(df, report_type)
+    with stage_timer(metrics, "write"):
+        AttendancePDFWriter(metrics=metrics).write(df_var, report_type, io.BytesIO(), header_flags)
+    return len(df)
+
+def measure(path: str, pages: int, repeat: int, adaptive_ocr: bool = False, layout: bool = False) -> dict:
+    best: dict[str, float] = {}
+    rows = 0
+    counters = {}
+    for _ in range(repeat):
+        metrics = PipelineMetrics(path)
+        rows = run_pipeline(path, metrics, adaptive_ocr, layout)
+        for stage, entry in metrics.as_dict()["stages"].items():
+            best[stage] = min(best.get(stage, entry["wall_seconds"]), entry["wall_seconds"])
+        counters = metrics.as_dict()["counters"]
+
+    tracemalloc.start()
+    try:
+        run_pipeline(path, PipelineMetrics(path), adaptive_ocr, layout)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    total = sum(best.values())
+    return {
+        "pages": pages,
+        "rows": rows,
+        "pages_ocr": counters.get("pages_ocr", 0),
+        "stages": {stage: round(best.get(stage, 0.0), 6) for stage in STAGES},
+        "total_seconds": round(total, 6),
+        "pages_per_second": round(pages / total, 2) if total else 0.0,
+        "rows_per_second": round(rows / total, 2) if total else 0.0,
+        "peak_mb": round(peak / (1024 * 1024), 2),
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for stage in (*STAGES, "total"):
+            now = result["total_seconds"] if stage == "total" else result["stages"][stage]
+            before = base["total_seconds"] if stage == "total" else base["stages"].get(stage, 0.0)
+            if before and now > before * (1 + tolerance) and now - before > min_delta:
+                regressions.append(f"{name} {stage}: {before * 1000:.1f} ms -> {now * 1000:.1f} ms "
+                                   f"({now / before:.2f}x)")
+        if result["peak_mb"] > base.get("peak_mb", 0) * (1 + tolerance) and base.get("peak_mb"):
+            regressions.append(f"{name} peak memory: {base['peak_mb']:.1f} MB -> {result['peak_mb']:.1f} MB")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic attendance reports")
+    parser.add_argument("--types", nargs="+", choices=["A", "B"], default=["A", "B"])
+    parser.add_argument("--days", nargs="+", type=int, default=[31, 365],
+                        help="rows per report; page count grows with it")
+    parser.add_argument("--image-ratios", nargs="+", type=float, default=[0.0, 0.25],
+                        help="share of pages rendered as image-only scans")
+    parser.add_argument("--noise-levels", nargs="+", type=float, default=[0.0],
+                        help="OCR noise levels (0..1)")
+    parser.add_argument("--adaptive-ocr", action="store_true",
+                        help="read image-only pages with the adaptive OCR mode")
+    parser.add_argument("--layout", action="store_true",
+                        help="extract rows of text pages by word position")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", default=None, help="keep the generated PDFs in this directory")
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown against the baseline before it is reported (default: 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0,
+                        help="ignore slowdowns smaller than this many milliseconds")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    if any(args.image_ratios) and not shutil.which(configure_tesseract()):
+        print("Warning: Tesseract not found; image-only pages are timed but yield no text")
+
+    work_dir = args.keep or tempfile.mkdtemp(prefix="attendance-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    results: dict[str, dict] = {}
+    try:
+        for report_type, days, image_ratio, noise in product(args.types, args.days, args.image_ratios,
+                                                              args.noise_levels):
+            name = scenario_name(report_type, days, image_ratio, noise)
+            path = os.path.join(work_dir, f"{name}.pdf")
+            pages = generate_report(path, report_type, days, image_ratio, noise, args.seed)
+            results[name] = measure(path, pages, args.repeat, args.adaptive_ocr, args.layout)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    header = f"{'scenario':<22}{'pages':>6}{'rows':>6}" + "".join(f"{s + ' ms':>12}" for s in STAGES)
+    print(header + f"{'pages/s':>10}{'rows/s':>10}{'peak MB':>9}{'vs base':>9}")
+    for name, r in results.items():
+        base = baseline.get(name)
+        ratio = f"{r['total_seconds'] / base['total_seconds']:.2f}x" if base and base["total_seconds"] else "-"
+        print(f"{name:<22}{r['pages']:>6}{r['rows']:>6}"
+              + "".join(f"{r['stages'][s] * 1000:>12.1f}" for s in STAGES)
+              + f"{r['pages_per_second']:>10.1f}{r['rows_per_second']:>10.1f}{r['peak_mb']:>9.1f}{ratio:>9}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms / 1000)
+    for line in regressions:
+        print(f"Regression: {line}")
+    if baseline and not regressions:
+        print(f"No regressions against {args.baseline}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
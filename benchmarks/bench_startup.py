@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic_reports import generate_report
+
+HEAVY_MODULES = ("pandas", "numpy", "fitz", "pymupdf", "pytesseract", "tesserocr", "PIL", "reportlab", "bidi")
+MAIN = os.path.join(ROOT, "main.py")
+
+def scenarios(work_dir: str) -> dict[str, list[str]]:
+    return {
+        "import": [sys.executable, "-c", "import main"],
+        "help": [sys.executable, MAIN, "--help"],
+        "missing-file": [sys.executable, MAIN, "missing.pdf", "--no-cache"],
+        "native-report": [sys.executable, MAIN, "report.pdf", "--no-cache"],
+    }
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    return env
+
+def loaded_heavy_modules(cmd: list[str], cwd: str) -> list[str]:
+    proc = subprocess.run([cmd[0], "-X", "importtime", *cmd[1:]], cwd=cwd, env=_env(),
+                          capture_output=True, text=True)
+    loaded = set()
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            name = line.rsplit("|", 1)[1].strip()
+            if name in HEAVY_MODULES:
+                loaded.add(name)
+    return sorted(loaded)
+
+def measure(cmd: list[str], cwd: str, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(cmd, cwd=cwd, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        times.append(time.perf_counter() - started)
+    return {
+        "best_ms": round(min(times) * 1000, 1),
+        "median_ms": round(statistics.median(times) * 1000, 1),
+        "heavy_modules": loaded_heavy_modules(cmd, cwd),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure CLI start-up time and which heavy modules each path loads")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--days", type=int, default=31, help="rows in the native report scenario")
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="attendance-startup-")
+    results: dict[str, dict] = {}
+    try:
+        os.makedirs(os.path.join(work_dir, "input_reports"))
+        os.makedirs(os.path.join(work_dir, "output_reports"))
+        generate_report(os.path.join(work_dir, "input_reports", "report.pdf"), "B", args.days)
+        for name, cmd in scenarios(work_dir).items():
+            results[name] = measure(cmd, work_dir, args.repeat)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{'scenario':<16}{'best ms':>10}{'median ms':>11}  heavy modules")
+    for name, r in results.items():
+        print(f"{name:<16}{r['best_ms']:>10.1f}{r['median_ms']:>11.1f}  {', '.join(r['heavy_modules']) or '-'}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import io
+import os
+import sys
+import random
+import argparse
+from datetime import date, timedelta
+
+import fitz
+import pandas as pd
+from PIL import Image, ImageFilter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from report_writer import AttendancePDFWriter
+
+OCR_CONFUSABLES = {'0': 'O', '1': 'l', '5': 'S', '8': 'B'}
+IMAGE_ZOOM = 2
+
+def _work_days(days: int, start: date = date(2024, 1, 1)) -> list[date]:
+    return [start + timedelta(days=i) for i in range(days)]
+
+def _noisy(text: str, noise: float, rng: random.Random) -> str:
+    if not noise:
+        return text
+    return "".join(OCR_CONFUSABLES[ch] if ch in OCR_CONFUSABLES and rng.random() < noise else ch for ch in text)
+
+def _shift(rng: random.Random) -> tuple[str, str, float]:
+    start = rng.choice([7, 8, 8, 9]) * 60 + rng.choice([0, 15, 30, 45])
+    end = start + rng.choice([8, 9, 9, 10]) * 60 + rng.choice([0, 10, 20, 30])
+    if rng.random() < 0.08:
+        end = start + rng.choice([5, 20 * 60])
+    end %= 24 * 60
+    hours = round(((end - start) % (24 * 60)) / 60, 2)
+    return f"{start // 60:02d}:{start % 60:02d}", f"{end // 60:02d}:{end % 60:02d}", hours
+
+def type_b_rows(days: int, noise: float = 0.0, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    rows = []
+    for day in _work_days(days):
+        start, end, hours = _shift(rng)
+        if rng.random() < 0.05:
+            end, hours = "", 0.0
+        rows.append({
+            "date": _noisy(day.strftime("%d/%m/%Y"), noise, rng),
+            "start": _noisy(start, noise, rng),
+            "end": _noisy(end, noise, rng),
+            "hours": hours,
+        })
+    return pd.DataFrame(rows)
+
+def type_a_rows(days: int, noise: float = 0.0, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    start, end, _ = _shift(rng)
+    dates = [_noisy(day.strftime("%d/%m/%Y"), noise, rng) for day in _work_days(days)]
+    starts = [_noisy(start, noise, rng) for _ in range(days)]
+    ends = [_noisy(end if rng.random() > 0.05 else _shift(rng)[1], noise, rng) for _ in range(days)]
+    blocks = [{"date": d} for d in dates] + [{"start": s} for s in starts] + [{"end": e} for e in ends]
+    return pd.DataFrame(blocks, columns=["date", "start", "end", "break"]).fillna("")
+
+def _rasterize(doc, page_num: int, noise: float, rng: random.Random) -> None:
+    page = doc.load_page(page_num)
+    pix = page.get_pixmap(matrix=fitz.Matrix(IMAGE_ZOOM, IMAGE_ZOOM), alpha=False)
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples).convert("L")
+    if noise:
+        img = img.filter(ImageFilter.GaussianBlur(radius=noise * 1.5))
+        pixels = img.load()
+        for _ in range(int(img.width * img.height * noise * 0.01)):
+            pixels[rng.randrange(img.width), rng.randrange(img.height)] = rng.choice((0, 255))
+    rect = page.rect
+    doc.delete_page(page_num)
+    image_page = doc.new_page(pno=page_num, width=rect.width, height=rect.height)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    image_page.insert_image(rect, stream=buffer.getvalue())
+
+def generate_report(path: str, report_type: str = "B", days: int = 30, image_ratio: float = 0.0,
+                    noise: float = 0.0, seed: int = 0) -> int:
+    rng = random.Random(seed)
+    df = type_a_rows(days, noise, seed) if report_type == "A" else type_b_rows(days, noise, seed)
+    header_flags = {"has_shabbat": report_type == "A", "has_break": report_type == "A", "has_notes": False}
+    AttendancePDFWriter().write(df, report_type, path, header_flags)
+
+    doc = fitz.open(path)
+    try:
+        page_count = len(doc)
+        image_pages = sorted(rng.sample(range(page_count), round(page_count * image_ratio)))
+        if not image_pages:
+            return page_count
+        for page_num in image_pages:
+            _rasterize(doc, page_num, noise, rng)
+        doc.save(path + ".tmp", garbage=3, deflate=True)
+    finally:
+        doc.close()
+    os.replace(path + ".tmp", path)
+    return page_count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic attendance reports for benchmarking")
+    parser.add_argument("output")
+    parser.add_argument("--type", choices=["A", "B"], default="B")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--image-ratio", type=float, default=0.0,
+                        help="share of pages replaced by image-only scans (0..1)")
+    parser.add_argument("--noise", type=float, default=0.0,
+                        help="OCR noise level (0..1): digit confusions, blur and speckles")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    pages = generate_report(args.output, args.type, args.days, args.image_ratio, args.noise, args.seed)
+    print(f"Wrote {args.output}: type {args.type}, {args.days} days, {pages} pages")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import socket
+import threading
+from datetime import datetime, timezone
+
+DEFAULT_STALE_AFTER = 600.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+def _read_json(path: str) -> dict | None:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable ledger file {path}: {e}")
+        return None
+
+def write_json(path: str, data: dict) -> None:
+    tmp = f"{path}.{socket.gethostname()}-{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+class WorkLedger:
+    def __init__(self, root: str, worker_id: str | None = None, stale_after: float = DEFAULT_STALE_AFTER,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.root = root
+        self.worker_id = worker_id or default_worker_id()
+        self.stale_after = stale_after
+        self.max_attempts = max(1, max_attempts)
+        self._held: set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat: threading.Thread | None = None
+        for kind in ("claims", "done", "attempts", "summaries"):
+            os.makedirs(os.path.join(root, kind), exist_ok=True)
+
+    def __enter__(self):
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._beat, name="ledger-heartbeat", daemon=True)
+        self._heartbeat.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        for name in list(self._held):
+            if exc_type is not None and issubclass(exc_type, Exception) and self.owns(name):
+                self.record_failure(name, f"run aborted: {exc_type.__name__}: {exc}")
+            self.release(name)
+
+    def _path(self, kind: str, name: str) -> str:
+        return os.path.join(self.root, kind, f"{name}.json")
+
+    def _beat(self) -> None:
+        while not self._stop.wait(max(1.0, self.stale_after / 4)):
+            with self._lock:
+                held = list(self._held)
+            for name in held:
+                if not self.owns(name):
+                    with self._lock:
+                        self._held.discard(name)
+                    print(f"Warning: Claim on {name} was taken over by another worker")
+                    continue
+                try:
+                    os.utime(self._path("claims", name))
+                except FileNotFoundError:
+                    pass
+
+    def owns(self, name: str) -> bool:
+        info = _read_json(self._path("claims", name))
+        return info is not None and info.get("worker") == self.worker_id
+
+    def done_entry(self, name: str) -> dict | None:
+        return _read_json(self._path("done", name))
+
+    def is_done(self, name: str, in_file: str) -> bool:
+        entry = self.done_entry(name)
+        if entry is None:
+            return False
+        st = os.stat(in_file)
+        return entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns
+
+    def claim(self, name: str) -> bool:
+        path = self._path("claims", name)
+        info = {"worker": self.worker_id, "claimed_at": _now()}
+        recovered = None
+        while True:
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    age = time.time() - os.stat(path).st_mtime
+                except FileNotFoundError:
+                    continue
+                if age < self.stale_after:
+                    return False
+                recovered = self._take_stale(path)
+                if recovered is None:
+                    return False
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(info, f)
+            with self._lock:
+                self._held.add(name)
+            if recovered is not None:
+                print(f"Recovered stale claim on {name} from {recovered.get('worker', 'unknown worker')}")
+                self.record_failure(name, f"stale claim from {recovered.get('worker', 'unknown worker')}")
+            return True
+
+    def _take_stale(self, path: str) -> dict | None:
+        grave = f"{path}.{self.worker_id}.stale"
+        try:
+            os.rename(path, grave)
+        except FileNotFoundError:
+            return None
+        if time.time() - os.stat(grave).st_mtime < self.stale_after:
+            try:
+                os.link(grave, path)
+            except FileExistsError:
+                pass
+            os.remove(grave)
+            return None
+        info = _read_json(grave) or {}
+        os.remove(grave)
+        return info
+
+    def release(self, name: str) -> None:
+        with self._lock:
+            self._held.discard(name)
+        if not self.owns(name):
+            return
+        try:
+            os.remove(self._path("claims", name))
+        except FileNotFoundError:
+            pass
+
+    def reset(self, name: str) -> None:
+        for kind in ("done", "attempts"):
+            try:
+                os.remove(self._path(kind, name))
+            except FileNotFoundError:
+                pass
+
+    def attempts(self, name: str) -> int:
+        return (_read_json(self._path("attempts", name)) or {}).get("attempts", 0)
+
+    def record_failure(self, name: str, error: str | None) -> int:
+        path = self._path("attempts", name)
+        state = _read_json(path) or {"attempts": 0, "errors": []}
+        state["attempts"] += 1
+        state["errors"].append({"worker": self.worker_id, "at": _now(), "error": error})
+        write_json(path, state)
+        return state["attempts"]
+
+    def mark_done(self, name: str, in_file: str, result: dict) -> None:
+        st = os.stat(in_file)
+        entry = {key: result.get(key) for key in ("input", "output", "status", "rows", "error", "seconds")}
+        if result.get("ocr_failed"):
+            entry["ocr_failed"] = result["ocr_failed"]
+        entry.update({
+            "worker": self.worker_id,
+            "attempts": self.attempts(name) + (result["status"] != "failed" and not result.get("ocr_failed")),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "finished_at": _now(),
+        })
+        write_json(self._path("done", name), entry)
+
+    def save_summary(self, summary: dict) -> None:
+        write_json(os.path.join(self.root, "summaries", f"{self.worker_id}.json"), summary)
+
+    def shard_summaries(self, since: str | None = None) -> list[dict]:
+        directory = os.path.join(self.root, "summaries")
+        summaries = [_read_json(os.path.join(directory, f)) for f in sorted(os.listdir(directory))
+                     if f.endswith('.json')]
+        return [s for s in summaries if s is not None and (since is None or s.get("finished_at", "") >= since)]
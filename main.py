@@ -1,58 +1,307 @@
 import os
-import sys
-from report_utils import AttendancePDFReader, AttendanceTableExtractor
-from rules import AttendanceVariationRules
-from report_writer import AttendancePDFWriter
-
-def process_report(input_pdf: str, output_pdf: str):
-    print(f"Processing: {input_pdf}")
-    reader = AttendancePDFReader(input_pdf)
-    first_page_text = reader.extract_text_first_page()
-    all_pages_text = reader.extract_text_all_pages()
-    
+import argparse
+from report_utils import AttendancePDFReader, AttendanceTableExtractor, iter_joined_lines, source_name, OCR_BACKENDS
+from text_cache import PageTextCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from batch import run_batch, run_sharded, output_name, list_reports
+from ledger import DEFAULT_MAX_ATTEMPTS, DEFAULT_STALE_AFTER
+from metrics import PipelineMetrics, stage_timer, append_json_log, write_prometheus, make_metrics
+
+STREAM_CHUNK_ROWS = 1024
+
+class _PageStream:
+    def __init__(self, pages, preview_chars: int = 500):
+        self._pages = pages
+        self._preview_chars = preview_chars
+        self.preview = ""
+        self.length = 0
+        self._first_char = None
+        self._last_char = 0
+
+    def __iter__(self):
+        for idx, page in enumerate(self._pages):
+            if idx:
+                self.length += 1
+            if len(self.preview) < self._preview_chars:
+                self.preview = (self.preview + "\n" + page if idx else page)[:self._preview_chars]
+            stripped = page.lstrip()
+            if stripped:
+                if self._first_char is None:
+                    self._first_char = self.length + len(page) - len(stripped)
+                self._last_char = self.length + len(page.rstrip())
+            self.length += len(page)
+            yield page
+
+    @property
+    def stripped_length(self) -> int:
+        return 0 if self._first_char is None else self._last_char - self._first_char
+
+def process_report(input_pdf: str, output_pdf: str, ocr_workers: int = 1, ocr_timeout: float | None = None,
+                   cache: PageTextCache | None = None, streaming: bool = False,
+                   metrics: PipelineMetrics | None = None, adaptive_ocr: bool = False, layout: bool = False):
+    if streaming:
+        return process_report_streaming(input_pdf, output_pdf, ocr_workers, ocr_timeout, cache, metrics, adaptive_ocr)
+    report = build_report(input_pdf, ocr_workers, ocr_timeout, cache, metrics=metrics, adaptive_ocr=adaptive_ocr,
+                          layout=layout)
+    if report is None:
+        return 0
+    df_var, report_type, header_flags = report
+
+    with stage_timer(metrics, "write"):
+        from report_writer import AttendancePDFWriter
+
+        writer = AttendancePDFWriter(metrics=metrics)
+        writer.write(df_var, report_type, output_pdf, header_flags)
+    print(f"Successfully created: {source_name(output_pdf)}")
+    return len(df_var)
+
+def build_report(input_pdf: str, ocr_workers: int = 1, ocr_timeout: float | None = None,
+                 cache: PageTextCache | None = None, log: list | None = None,
+                 metrics: PipelineMetrics | None = None, adaptive_ocr: bool = False, layout: bool = False):
+    name = source_name(input_pdf)
+    print(f"Processing: {name}")
+    with stage_timer(metrics, "read"), AttendancePDFReader(input_pdf, ocr_workers=ocr_workers, ocr_timeout=ocr_timeout,
+                                                           cache=cache, metrics=metrics,
+                                                           adaptive_ocr=adaptive_ocr) as reader:
+        first_page_text = reader.extract_text_first_page()
+        all_pages_text = reader.extract_text_all_pages()
+        pages_words = reader.extract_words_all_pages() if layout else None
+
+    extracted = extract_report(name, first_page_text, all_pages_text, metrics, pages_words)
+    if extracted is None:
+        return None
+    df, report_type, header_flags = extracted
+
+    df_var = apply_rules(name, df, report_type, log, metrics)
+    if df_var is None:
+        return None
+    return df_var, report_type, header_flags
+
+def extract_report(input_pdf: str, first_page_text: str, all_pages_text: str,
+                   metrics: PipelineMetrics | None = None, pages_words=None):
     if not all_pages_text or len(all_pages_text.strip()) < 10:
         print(f"Warning: Extracted text is empty or too short from {input_pdf}")
         print(f"First page text length: {len(first_page_text)}")
-        return
+        return None
 
-    extractor = AttendanceTableExtractor()
-    df = extractor.extract_table_from_text(all_pages_text)
+    with stage_timer(metrics, "extract"):
+        extractor = AttendanceTableExtractor()
+        tokens = extractor.tokenize(all_pages_text)
+        df = extractor.extract_layout_records(pages_words) if pages_words else None
+        if df is None:
+            df = extractor.extract_records(tokens)
+        elif metrics is not None:
+            metrics.incr("rows_layout", len(df))
+        report_type = extractor.detect_report_type(tokens)
+        header_flags = extractor.detect_columns(first_page_text)
+    if metrics is not None:
+        metrics.incr("lines_tokenized", tokens.line_count)
+        metrics.incr("rows_extracted", len(df))
     
     if df.empty:
         print(f"Warning: No dates/times found in extracted text from {input_pdf}")
         print(f"Extracted text preview (first 500 chars): {all_pages_text[:500]}")
-        return
+        return None
 
     print(f"Extracted {len(df)} rows from {input_pdf}")
+    return df, report_type, header_flags
 
-    report_type = extractor.detect_report_type(all_pages_text)
-    header_flags = extractor.detect_columns(first_page_text)
+def apply_rules(input_pdf: str, df, report_type: str, log: list | None = None,
+                metrics: PipelineMetrics | None = None):
+    with stage_timer(metrics, "rules"):
+        from rules import AttendanceVariationRules
 
-    df_var, _ = AttendanceVariationRules().apply(df, report_type)
+        df_var, rules_log = AttendanceVariationRules(metrics).apply(df, report_type)
+    if log is not None:
+        log.extend(rules_log)
     
     if df_var.empty:
         print(f"Warning: DataFrame became empty after applying rules from {input_pdf}")
-        return
+        return None
+    return df_var
+
+def process_bundle(input_files: list[str], bundle_path: str, ocr_workers: int = 1, ocr_timeout: float | None = None,
+                   cache: PageTextCache | None = None, metrics: PipelineMetrics | None = None,
+                   adaptive_ocr: bool = False, layout: bool = False):
+    def reports():
+        for in_file in input_files:
+            try:
+                report = build_report(in_file, ocr_workers, ocr_timeout, cache, metrics=metrics,
+                                      adaptive_ocr=adaptive_ocr, layout=layout)
+            except Exception as e:
+                print(f"Error: Skipping {in_file} in bundle: {type(e).__name__}: {e}")
+                continue
+            if report is not None:
+                name = os.path.splitext(os.path.basename(in_file))[0]
+                yield (name, *report)
 
-    writer = AttendancePDFWriter()
-    writer.write(df_var, report_type, output_pdf, header_flags)
-    print(f"Successfully created: {output_pdf}")
+    from report_writer import AttendancePDFWriter
+
+    writer = AttendancePDFWriter(metrics=metrics)
+    if bundle_path.lower().endswith('.zip'):
+        written = writer.write_zip(reports(), bundle_path)
+    else:
+        written = writer.write_many(reports(), bundle_path)
+    print(f"Bundled {written} of {len(input_files)} reports into {bundle_path}")
+    return written
+
+def process_report_streaming(input_pdf: str, output_pdf: str, ocr_workers: int = 1, ocr_timeout: float | None = None,
+                             cache: PageTextCache | None = None, metrics: PipelineMetrics | None = None,
+                             adaptive_ocr: bool = False):
+    name = source_name(input_pdf)
+    print(f"Processing: {name}")
+    extractor = AttendanceTableExtractor()
+    with stage_timer(metrics, "read_extract"), AttendancePDFReader(input_pdf, ocr_workers=ocr_workers,
+                                                                   ocr_timeout=ocr_timeout, cache=cache,
+                                                                   metrics=metrics,
+                                                                   adaptive_ocr=adaptive_ocr) as reader:
+        pages = _PageStream(reader.iter_pages())
+        tokens = extractor.tokenize_lines(iter_joined_lines(pages))
+        first_page_text = reader.extract_text_first_page()
+    if metrics is not None:
+        metrics.incr("lines_tokenized", tokens.line_count)
+        metrics.incr("rows_extracted", len(tokens.date_positions))
+
+    if not pages.length or pages.stripped_length < 10:
+        print(f"Warning: Extracted text is empty or too short from {name}")
+        print(f"First page text length: {len(first_page_text)}")
+        return 0
+
+    if not tokens.date_positions:
+        print(f"Warning: No dates/times found in extracted text from {name}")
+        print(f"Extracted text preview (first 500 chars): {pages.preview}")
+        return 0
+
+    print(f"Extracted {len(tokens.date_positions)} rows from {name}")
+
+    report_type = extractor.detect_report_type(tokens)
+    header_flags = extractor.detect_columns(first_page_text)
+
+    with stage_timer(metrics, "rules_write"):
+        from rules import AttendanceVariationRules
+        from report_writer import AttendancePDFWriter
+
+        rules = AttendanceVariationRules(metrics)
+        records = extractor.extract_records(tokens)
+        rows = (row for chunk in records.chunks(STREAM_CHUNK_ROWS)
+                for row in rules.apply_records(chunk, report_type)[0].iter_rows())
+        written = AttendancePDFWriter(metrics=metrics).write_rows(rows, report_type, output_pdf, header_flags,
+                                                                  rules.output_columns(report_type))
+    if written:
+        print(f"Successfully created: {source_name(output_pdf)}")
+    return written
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Attendance variation report generator")
+    parser.add_argument("filename", nargs="?", help="single PDF inside input_reports to process")
+    parser.add_argument("--ocr-workers", type=int, default=1,
+                        help="processes used to OCR scanned pages in parallel (default: 1)")
+    parser.add_argument("--ocr-timeout", type=float, default=None,
+                        help="seconds allowed for Tesseract on a single page")
+    parser.add_argument("--ocr-backend", choices=OCR_BACKENDS, default=None,
+                        help="tesserocr keeps one Tesseract engine per process and passes page pixels directly; "
+                             "pytesseract runs the tesseract command per page (default: tesserocr when installed)")
+    parser.add_argument("--adaptive-ocr", action="store_true",
+                        help="OCR scans in grayscale at lower resolution, cropped to the content, "
+                             "and retry at full resolution only when no dates/times are found")
+    parser.add_argument("--layout", action="store_true",
+                        help="read rows of text PDFs by word position under the table header; "
+                             "falls back to the text heuristics for scans and unrecognized layouts")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="bypass the on-disk page text cache")
+    parser.add_argument("--clear-cache", action="store_true",
+                        help="empty the page text cache before processing")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"page text cache location (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-size-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="maximum cache size before least-recently-used pages are evicted")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="reports processed concurrently in directory mode (default: 1)")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="reports queued ahead of the workers (default: 2 x workers)")
+    parser.add_argument("--summary", default=None,
+                        help="where to write the JSON batch summary (default: output_reports/batch_summary.json)")
+    parser.add_argument("--bundle", default=None,
+                        help="write every report into one PDF with bookmarks (or a .zip of PDFs) at this path")
+    parser.add_argument("--streaming", action="store_true",
+                        help="read pages lazily and draw rows as they are validated to bound memory")
+    parser.add_argument("--force", action="store_true",
+                        help="reprocess every report, even those the output manifest marks as up to date")
+    parser.add_argument("--ledger", default=None,
+                        help="shared work ledger directory: several hosts can process input_reports together, "
+                             "each claiming files in it; the merged summary covers all of them")
+    parser.add_argument("--worker-id", default=None,
+                        help="name of this worker in the ledger (default: host name and process id)")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="attempts per report in ledger mode before it is recorded as failed")
+    parser.add_argument("--stale-after", type=float, default=DEFAULT_STALE_AFTER,
+                        help="seconds without a heartbeat after which another worker takes over a claim")
+    parser.add_argument("--metrics-log", default=None,
+                        help="append one JSON line of stage timings and counters per report to this file")
+    parser.add_argument("--prometheus", default=None,
+                        help="write the run's aggregated metrics in Prometheus text format to this file")
+    parser.add_argument("--profile", default=None,
+                        help="record per-page OCR decisions, append them to this JSON lines file and print the "
+                             "slowest documents and pages")
+    parser.add_argument("--profile-cpu", action="store_true",
+                        help="with --profile, capture the top functions of every stage with cProfile")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="with --profile, capture peak memory and top allocations of every stage with tracemalloc")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
     input_dir = "input_reports"
     output_dir = "output_reports"
+    args = parse_args()
+    if args.ocr_backend:
+        os.environ['ATTENDANCE_OCR_BACKEND'] = args.ocr_backend
+
+    cache = PageTextCache(args.cache_dir, args.cache_size_mb * 1024 * 1024)
+    if args.clear_cache:
+        cache.clear()
+        print(f"Cleared page text cache at {args.cache_dir}")
+    if args.no_cache:
+        cache = None
+    reader_options = {"ocr_workers": args.ocr_workers, "ocr_timeout": args.ocr_timeout, "cache": cache,
+                      "streaming": args.streaming, "adaptive_ocr": args.adaptive_ocr, "layout": args.layout}
+    collect_metrics = bool(args.metrics_log or args.prometheus)
+    profile = {"cpu": args.profile_cpu, "memory": args.profile_memory} if args.profile else None
+    profile_options = {"profile_path": args.profile, "profile_cpu": args.profile_cpu,
+                       "profile_memory": args.profile_memory}
 
-    if len(sys.argv) > 1:
-        fname = sys.argv[1]
+    if args.filename:
+        fname = args.filename
         in_file = os.path.join(input_dir, fname)
-        out_file = os.path.join(output_dir, fname.replace('.pdf', '_variation.pdf'))
+        out_file = os.path.join(output_dir, output_name(fname))
         if os.path.exists(in_file):
-            process_report(in_file, out_file)
+            metrics = make_metrics(in_file, collect_metrics, profile)
+            process_report(in_file, out_file, metrics=metrics, **reader_options)
+            if args.metrics_log:
+                append_json_log(args.metrics_log, [metrics])
+            if args.prometheus:
+                write_prometheus(args.prometheus, metrics)
+            if args.profile:
+                from profiling import write_profile_report
+                write_profile_report(args.profile, [metrics])
         else:
             print(f"Error: File not found at {in_file}")
+    elif args.bundle:
+        metrics = make_metrics(args.bundle, collect_metrics, profile)
+        process_bundle([os.path.join(input_dir, f) for f in list_reports(input_dir)], args.bundle,
+                       ocr_workers=args.ocr_workers, ocr_timeout=args.ocr_timeout, cache=cache, metrics=metrics,
+                       adaptive_ocr=args.adaptive_ocr, layout=args.layout)
+        if args.metrics_log:
+            append_json_log(args.metrics_log, [metrics])
+        if args.prometheus:
+            write_prometheus(args.prometheus, metrics)
+        if args.profile:
+            from profiling import write_profile_report
+            write_profile_report(args.profile, [metrics])
+    elif args.ledger:
+        run_sharded(input_dir, output_dir, args.ledger, workers=args.workers, max_pending=args.max_pending,
+                    summary_path=args.summary, metrics_log=args.metrics_log, prometheus_path=args.prometheus,
+                    worker_id=args.worker_id, max_attempts=args.max_attempts, stale_after=args.stale_after,
+                    **profile_options, **reader_options)
     else:
-        for fname in os.listdir(input_dir):
-            if fname.lower().endswith('.pdf'):
-                in_file = os.path.join(input_dir, fname)
-                out_file = os.path.join(output_dir, fname.replace('.pdf', '_variation.pdf'))
-                process_report(in_file, out_file)
+        run_batch(input_dir, output_dir, workers=args.workers, max_pending=args.max_pending,
+                  summary_path=args.summary, metrics_log=args.metrics_log, prometheus_path=args.prometheus,
+                  force=args.force, **profile_options, **reader_options)
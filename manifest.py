@@ -0,0 +1,93 @@
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+
+from text_cache import PageTextCache
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_FORMAT = 1
+VERSIONED_SOURCES = {
+    "extractor": ("report_utils.py", "records.py"),
+    "rules": ("rules.py", "records.py"),
+    "writer": ("report_writer.py",),
+}
+
+def _source_digest(files) -> str:
+    h = hashlib.sha256()
+    root = os.path.dirname(os.path.abspath(__file__))
+    for name in files:
+        with open(os.path.join(root, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+def code_versions() -> dict:
+    return {stage: _source_digest(files) for stage, files in VERSIONED_SOURCES.items()}
+
+class ReportManifest:
+    def __init__(self, path: str, options: dict | None = None):
+        self.path = path
+        self.options = options or {}
+        self.versions = code_versions()
+        self.entries: dict[str, dict] = {}
+        self._digests: dict[str, str] = {}
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable manifest {self.path}: {e}")
+            return
+        if data.get("format") == MANIFEST_FORMAT:
+            self.entries = data.get("files", {})
+
+    def save(self, keep: set[str] | None = None) -> None:
+        files = self.entries if keep is None else {k: v for k, v in self.entries.items() if k in keep}
+        data = {"format": MANIFEST_FORMAT, "versions": self.versions, "files": files}
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+    def digest(self, name: str, in_file: str) -> str:
+        if name in self._digests:
+            return self._digests[name]
+        st = os.stat(in_file)
+        entry = self.entries.get(name)
+        if entry and entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+            digest = entry["digest"]
+        else:
+            digest = PageTextCache.file_digest(in_file)
+        self._digests[name] = digest
+        return digest
+
+    def is_current(self, name: str, in_file: str, out_file: str) -> bool:
+        entry = self.entries.get(name)
+        if not entry or entry.get("status") not in ("ok", "empty"):
+            return False
+        if entry.get("versions") != self.versions or entry.get("options", {}) != self.options:
+            return False
+        if entry["status"] == "ok" and not os.path.exists(out_file):
+            return False
+        return entry.get("digest") == self.digest(name, in_file)
+
+    def record(self, name: str, in_file: str, result: dict) -> None:
+        if result["status"] not in ("ok", "empty") or result.get("ocr_failed"):
+            self.entries.pop(name, None)
+            return
+        st = os.stat(in_file)
+        self.entries[name] = {
+            "digest": self.digest(name, in_file),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "versions": self.versions,
+            "options": self.options,
+            "status": result["status"],
+            "rows": result["rows"],
+            "output": os.path.basename(result["output"]) if result["output"] else None,
+            "processed_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
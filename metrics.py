@@ -0,0 +1,137 @@
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+PROMETHEUS_PREFIX = "attendance_"
+
+class PipelineMetrics:
+    records_pages = False
+
+    def __init__(self, document: str | None = None):
+        self.document = document
+        self.stages: dict[str, dict] = {}
+        self.counters: dict[str, float] = {}
+        self.ocr_pages: dict[int, float] = {}
+        self.ocr_count = 0
+        self.ocr_seconds = 0.0
+        self.ocr_max_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield self
+        finally:
+            self.add_stage(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def add_stage(self, name: str, wall: float, cpu: float, calls: int = 1) -> None:
+        with self._lock:
+            entry = self.stages.setdefault(name, {"wall_seconds": 0.0, "cpu_seconds": 0.0, "calls": 0})
+            entry["wall_seconds"] += wall
+            entry["cpu_seconds"] += cpu
+            entry["calls"] += calls
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe_ocr(self, page_num: int, seconds: float) -> None:
+        with self._lock:
+            self.ocr_pages[page_num] = seconds
+            self._add_ocr(1, seconds, seconds)
+
+    def _add_ocr(self, count: int, seconds: float, max_seconds: float) -> None:
+        self.ocr_count += count
+        self.ocr_seconds += seconds
+        self.ocr_max_seconds = max(self.ocr_max_seconds, max_seconds)
+
+    def merge(self, other) -> None:
+        data = other.as_dict() if isinstance(other, PipelineMetrics) else other
+        for name, entry in data.get("stages", {}).items():
+            self.add_stage(name, entry["wall_seconds"], entry["cpu_seconds"], entry["calls"])
+        for name, value in data.get("counters", {}).items():
+            self.incr(name, value)
+        ocr = data.get("ocr", {})
+        if ocr.get("pages"):
+            with self._lock:
+                self._add_ocr(ocr["pages"], ocr["total_seconds"], ocr["max_seconds"])
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "document": self.document,
+                "stages": {
+                    name: {"wall_seconds": round(e["wall_seconds"], 6), "cpu_seconds": round(e["cpu_seconds"], 6),
+                           "calls": e["calls"]}
+                    for name, e in self.stages.items()
+                },
+                "counters": dict(self.counters),
+                "ocr": {
+                    "pages": self.ocr_count,
+                    "total_seconds": round(self.ocr_seconds, 6),
+                    "max_seconds": round(self.ocr_max_seconds, 6),
+                    "page_seconds": {str(p): round(s, 6) for p, s in sorted(self.ocr_pages.items())},
+                },
+            }
+
+    def to_json(self, event: str = "report_metrics") -> str:
+        return json_record(self.as_dict(), event)
+
+    def prometheus_text(self, prefix: str = PROMETHEUS_PREFIX) -> str:
+        data = self.as_dict()
+        lines = []
+
+        def metric(name, kind, samples):
+            lines.append(f"# TYPE {prefix}{name} {kind}")
+            for labels, value in samples:
+                label_text = "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}" if labels else ""
+                lines.append(f"{prefix}{name}{label_text} {value:g}")
+
+        stages = data["stages"]
+        if stages:
+            metric("stage_wall_seconds_total", "counter",
+                   [({"stage": s}, e["wall_seconds"]) for s, e in sorted(stages.items())])
+            metric("stage_cpu_seconds_total", "counter",
+                   [({"stage": s}, e["cpu_seconds"]) for s, e in sorted(stages.items())])
+            metric("stage_calls_total", "counter",
+                   [({"stage": s}, e["calls"]) for s, e in sorted(stages.items())])
+
+        ocr = data["ocr"]
+        lines.append(f"# TYPE {prefix}ocr_page_seconds summary")
+        lines.append(f"{prefix}ocr_page_seconds_sum {ocr['total_seconds']:g}")
+        lines.append(f"{prefix}ocr_page_seconds_count {ocr['pages']:g}")
+        metric("ocr_page_seconds_max", "gauge", [({}, ocr["max_seconds"])])
+
+        for name, value in sorted(data["counters"].items()):
+            metric(f"{name}_total", "counter", [({}, value)])
+        return "\n".join(lines) + "\n"
+
+def json_record(data: dict, event: str = "report_metrics") -> str:
+    record = {"event": event, "at": datetime.now(timezone.utc).isoformat(timespec="seconds"), **data}
+    return json.dumps(record, ensure_ascii=False)
+
+def append_json_log(path: str, records, event: str = "report_metrics") -> None:
+    with open(path, 'a', encoding='utf-8') as f:
+        for data in records:
+            f.write(json_record(data.as_dict() if isinstance(data, PipelineMetrics) else data, event) + "\n")
+
+def write_prometheus(path: str, metrics: PipelineMetrics) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(metrics.prometheus_text())
+
+def make_metrics(document: str | None, collect: bool = False, profile: dict | None = None):
+    if profile is not None:
+        from profiling import ProfilingMetrics
+        return ProfilingMetrics(document, **profile)
+    return PipelineMetrics(document) if collect else None
+
+@contextmanager
+def stage_timer(metrics: PipelineMetrics | None, name: str):
+    if metrics is None:
+        yield None
+        return
+    with metrics.stage(name):
+        yield metrics
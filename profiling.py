@@ -0,0 +1,132 @@
+import cProfile
+import pstats
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from metrics import PipelineMetrics, append_json_log
+
+PROFILE_TOP = 15
+REPORT_TOP = 10
+
+def _start_profiler() -> cProfile.Profile | None:
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+def _top_functions(profiler: cProfile.Profile, top: int) -> list[dict]:
+    stats = pstats.Stats(profiler).stats
+    ranked = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+    return [
+        {"function": pstats.func_std_string(func), "calls": nc, "own_seconds": round(tt, 6),
+         "cumulative_seconds": round(ct, 6)}
+        for func, (cc, nc, tt, ct, callers) in ranked
+    ]
+
+def _start_tracing() -> tuple[bool, tracemalloc.Snapshot]:
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    return started, tracemalloc.take_snapshot()
+
+def _memory_delta(state: tuple[bool, tracemalloc.Snapshot], top: int) -> dict:
+    started, before = state
+    if not tracemalloc.is_tracing():
+        return {}
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    if started:
+        tracemalloc.stop()
+    return {
+        "peak_traced_kb": round(peak / 1024, 1),
+        "top_allocations": [
+            {"where": str(stat.traceback[0]), "size_kb": round(stat.size_diff / 1024, 1), "count": stat.count_diff}
+            for stat in after.compare_to(before, 'lineno')[:top]
+        ],
+    }
+
+class ProfilingMetrics(PipelineMetrics):
+    records_pages = True
+
+    def __init__(self, document: str | None = None, cpu: bool = False, memory: bool = False, top: int = PROFILE_TOP):
+        super().__init__(document)
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        self.pages: dict[int, dict] = {}
+        self.profiles: dict[str, list[dict]] = {}
+
+    def record_page(self, page_num: int, branch: str, reason: str, native_chars: int = 0,
+                    ocr_seconds: float | None = None, renders: list | None = None) -> None:
+        entry = {"branch": branch, "reason": reason, "native_chars": native_chars}
+        if ocr_seconds is not None:
+            entry["ocr_seconds"] = round(ocr_seconds, 6)
+        if renders:
+            entry["render"] = [f"{w}x{h}" for w, h in renders]
+            entry["render_pixels"] = sum(w * h for w, h in renders)
+        with self._lock:
+            self.pages[page_num] = entry
+
+    @contextmanager
+    def stage(self, name: str):
+        profiler = _start_profiler() if self.cpu else None
+        tracing = _start_tracing() if self.memory else None
+        try:
+            with super().stage(name):
+                yield self
+        finally:
+            profile = {}
+            if profiler is not None:
+                profiler.disable()
+                profile["cpu"] = _top_functions(profiler, self.top)
+            if tracing is not None:
+                profile["memory"] = _memory_delta(tracing, self.top)
+            if profile:
+                with self._lock:
+                    self.profiles.setdefault(name, []).append(profile)
+
+    def as_dict(self) -> dict:
+        data = super().as_dict()
+        with self._lock:
+            data["pages"] = {str(p): dict(e) for p, e in sorted(self.pages.items())}
+            if self.profiles:
+                data["profiles"] = {name: list(runs) for name, runs in self.profiles.items()}
+        return data
+
+def document_seconds(data: dict) -> float:
+    return sum(e["wall_seconds"] for e in data.get("stages", {}).values())
+
+def slow_report(records: list[dict], top: int = REPORT_TOP) -> str:
+    lines = [f"Slowest documents (of {len(records)}):"]
+    for data in sorted(records, key=document_seconds, reverse=True)[:top]:
+        stages = ", ".join(f"{name} {e['wall_seconds'] * 1000:.0f} ms"
+                           for name, e in sorted(data["stages"].items(), key=lambda kv: -kv[1]["wall_seconds"]))
+        branches = Counter(e["branch"] for e in data.get("pages", {}).values())
+        pages = ", ".join(f"{count} {branch}" for branch, count in sorted(branches.items()))
+        lines.append(f"  {document_seconds(data) * 1000:9.1f} ms  {data['document']}  [{stages}]  pages: {pages or '-'}")
+
+    ocr_pages = [(data["document"], int(p), e) for data in records for p, e in data.get("pages", {}).items()
+                 if e["branch"] in ("ocr", "ocr_failed")]
+    if not ocr_pages:
+        lines.append("No pages fell back to OCR.")
+        return "\n".join(lines)
+
+    lines.append(f"Slowest OCR pages (of {len(ocr_pages)}):")
+    for document, page_num, e in sorted(ocr_pages, key=lambda x: x[2].get("ocr_seconds", 0.0), reverse=True)[:top]:
+        render = ", ".join(e.get("render", [])) or "-"
+        lines.append(f"  {e.get('ocr_seconds', 0.0) * 1000:9.1f} ms  {document} page {page_num + 1}  "
+                     f"{e['branch']}, render {render}, {e['native_chars']} native chars: {e['reason']}")
+
+    lines.append("OCR fallback reasons:")
+    for reason, count in Counter(e["reason"] for _, _, e in ocr_pages).most_common():
+        lines.append(f"  {count:6d}  {reason}")
+    return "\n".join(lines)
+
+def write_profile_report(path: str, records, top: int = REPORT_TOP) -> None:
+    records = [r.as_dict() if isinstance(r, PipelineMetrics) else r for r in records]
+    append_json_log(path, records, "report_profile")
+    print(slow_report(records, top))
@@ -0,0 +1,142 @@
+from array import array
+from datetime import date
+from functools import lru_cache
+
+NO_TIME = -1
+NO_DATE = 0
+MINUTES_PER_DAY = 24 * 60
+
+_TIME_TEXT = [f"{m // 60:02d}:{m % 60:02d}" for m in range(MINUTES_PER_DAY)]
+_TIME_MINUTES = {text: m for m, text in enumerate(_TIME_TEXT)}
+_WEEKDAYS = ["שני", "שלישי", "רביעי", "חמישי", "שישי", "שבת", "ראשון"]
+
+def time_minutes(text: str) -> int:
+    return _TIME_MINUTES.get(text, NO_TIME)
+
+def time_text(minutes: int) -> str:
+    return _TIME_TEXT[minutes] if minutes >= 0 else ""
+
+@lru_cache(maxsize=4096)
+def date_ordinal(iso: str) -> int:
+    return date.fromisoformat(iso).toordinal()
+
+@lru_cache(maxsize=4096)
+def date_text(ordinal: int) -> str:
+    return date.fromordinal(ordinal).isoformat() if ordinal else ""
+
+def weekday_text(ordinal: int) -> str:
+    return _WEEKDAYS[(ordinal + 6) % 7] if ordinal else ""
+
+class RecordRow:
+    __slots__ = ("records", "index")
+
+    def __init__(self, records: "AttendanceRecords", index: int):
+        self.records = records
+        self.index = index
+
+    def get(self, key: str, default=""):
+        if key not in self.records.columns:
+            return default
+        return self.records._value(key, self.index)
+
+    def __getitem__(self, key: str):
+        if key not in self.records.columns:
+            raise KeyError(key)
+        return self.records._value(key, self.index)
+
+class AttendanceRecords:
+    def __init__(self, text: str | None = None, columns=None):
+        self.text = text
+        self.columns = list(columns or ["date", "start", "end", "hours", "raw_line"])
+        self.day = array('i')
+        self.start = array('h')
+        self.end = array('h')
+        self.hours = array('d')
+        self.brk = array('h')
+        self.line_start = array('i')
+        self.line_end = array('i')
+        self._lines: list[str] | None = None if text is not None else []
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    @property
+    def empty(self) -> bool:
+        return not len(self.day)
+
+    def append(self, day: int, start: int, end: int, hours: float, brk: int = NO_TIME, raw_span=None,
+               raw_line: str = "") -> None:
+        self.day.append(day)
+        self.start.append(start)
+        self.end.append(end)
+        self.hours.append(hours)
+        self.brk.append(brk)
+        if self._lines is None:
+            self.line_start.append(raw_span[0])
+            self.line_end.append(raw_span[1])
+        else:
+            self._lines.append(raw_line)
+
+    def derive(self, columns, end: array, hours: array) -> "AttendanceRecords":
+        derived = AttendanceRecords(self.text, columns)
+        derived.day, derived.start, derived.brk = self.day, self.start, self.brk
+        derived.line_start, derived.line_end, derived._lines = self.line_start, self.line_end, self._lines
+        derived.end, derived.hours = end, hours
+        return derived
+
+    def chunks(self, size: int):
+        for first in range(0, len(self), size):
+            yield self._slice(slice(first, first + size))
+
+    def _slice(self, part: slice) -> "AttendanceRecords":
+        chunk = AttendanceRecords(self.text, self.columns)
+        chunk.day, chunk.start, chunk.end = self.day[part], self.start[part], self.end[part]
+        chunk.hours, chunk.brk = self.hours[part], self.brk[part]
+        chunk.line_start, chunk.line_end = self.line_start[part], self.line_end[part]
+        chunk._lines = None if self._lines is None else self._lines[part]
+        return chunk
+
+    def raw_line(self, i: int) -> str:
+        if self._lines is not None:
+            return self._lines[i]
+        return self.text[self.line_start[i]:self.line_end[i]]
+
+    def minutes(self, name: str):
+        import numpy as np
+
+        return np.frombuffer(getattr(self, name), dtype=np.int16).astype(np.int64)
+
+    def _value(self, key: str, i: int):
+        if key == "date":
+            return date_text(self.day[i])
+        if key == "start":
+            return time_text(self.start[i])
+        if key == "end":
+            return time_text(self.end[i])
+        if key == "hours":
+            return self.hours[i]
+        if key == "break":
+            return time_text(self.brk[i])
+        if key == "raw_line":
+            return self.raw_line(i)
+        if key == "weekday":
+            return weekday_text(self.day[i])
+        if key == "is_sat":
+            return 'כן' if weekday_text(self.day[i]) == 'שבת' else ''
+        return ""
+
+    def iter_rows(self):
+        for i in range(len(self)):
+            yield RecordRow(self, i)
+
+    def to_frame(self):
+        import numpy as np
+        import pandas as pd
+
+        if self.empty:
+            return pd.DataFrame()
+        n = len(self)
+        data = {key: [self._value(key, i) for i in range(n)] for key in self.columns}
+        if "hours" in data:
+            data["hours"] = np.frombuffer(self.hours, dtype=np.float64).copy()
+        return pd.DataFrame(data)
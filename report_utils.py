@@ -1,208 +1,742 @@
 import os
-import pytesseract
-import fitz
-import pandas as pd
-from PIL import Image
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
+from itertools import accumulate, islice
 import re
+import time
+import threading
+from records import AttendanceRecords, NO_TIME, time_minutes, date_ordinal
+
+_NATIVE_DATE_RE = re.compile(r"\d{1,2}[/-]\d{1,2}[/-]\d{2,4}")
+_NATIVE_TIME_RE = re.compile(r"\b\d{1,2}[:.：]\d{2}\b")
+_WORD_CHAR_RE = re.compile(r"\w")
+_tesseract_cmd: str | None = None
+
+@lru_cache(maxsize=None)
+def configure_tesseract():
+    tesseract_cmd = os.getenv('TESSERACT_CMD')
+    
+    if not tesseract_cmd or not os.path.isfile(tesseract_cmd):
+        standard_paths = [
+            '/usr/bin/tesseract',
+            '/usr/local/bin/tesseract',
+            '/opt/homebrew/bin/tesseract',
+        ]
+        for path in standard_paths:
+            if os.path.isfile(path):
+                tesseract_cmd = path
+                break
+    
+    if tesseract_cmd and os.path.isfile(tesseract_cmd):
+        tessdata_dir = os.path.join(os.path.dirname(tesseract_cmd), 'tessdata')
+        if os.path.isdir(tessdata_dir):
+            os.environ['TESSDATA_PREFIX'] = tessdata_dir
+        else:
+            common_tessdata = [
+                '/usr/share/tesseract-ocr/5/tessdata',
+                '/usr/share/tesseract-ocr/4.00/tessdata',
+                '/usr/local/share/tesseract-ocr/tessdata',
+            ]
+            for td_path in common_tessdata:
+                if os.path.isdir(td_path):
+                    os.environ['TESSDATA_PREFIX'] = td_path
+                    break
+        return tesseract_cmd
+    return 'tesseract'
+
+def _pytesseract():
+    import pytesseract
+
+    pytesseract.pytesseract.tesseract_cmd = _tesseract_cmd or configure_tesseract()
+    return pytesseract
+
+def _ocr_lang() -> str:
+    return _ocr_lang_for(os.getenv('TESSDATA_PREFIX', ''))
+
+@lru_cache(maxsize=None)
+def _ocr_lang_for(tessdata_dir: str) -> str:
+    lang = 'eng'
+    if tessdata_dir and os.path.isdir(tessdata_dir):
+        try:
+            if 'heb.traineddata' in os.listdir(tessdata_dir):
+                lang = 'heb+eng'
+        except (OSError, PermissionError):
+            pass
+    return lang
+
+OCR_BACKENDS = ("auto", "tesserocr", "pytesseract")
+_tess_engines = threading.local()
+
+def ocr_backend() -> str:
+    return _resolve_ocr_backend(os.getenv('ATTENDANCE_OCR_BACKEND', 'auto').lower())
+
+@lru_cache(maxsize=None)
+def _resolve_ocr_backend(backend: str) -> str:
+    if backend not in OCR_BACKENDS:
+        print(f"Warning: Unknown OCR backend '{backend}', using auto")
+        backend = 'auto'
+    if backend == 'pytesseract':
+        return backend
+    if _tesserocr_module() is None:
+        if backend == 'tesserocr':
+            print("Warning: tesserocr is not installed, falling back to pytesseract")
+        return 'pytesseract'
+    return 'tesserocr'
+
+@lru_cache(maxsize=None)
+def _tesserocr_module():
+    try:
+        import tesserocr
+        return tesserocr
+    except ImportError:
+        return None
+
+def ocr_engine():
+    tessdata_dir = os.getenv('TESSDATA_PREFIX', '')
+    lang = _ocr_lang_for(tessdata_dir)
+    engines = getattr(_tess_engines, 'by_lang', None)
+    if engines is None:
+        engines = _tess_engines.by_lang = {}
+    key = (tessdata_dir, lang)
+    if key not in engines:
+        tesserocr = _tesserocr_module()
+        options = {"path": tessdata_dir} if tessdata_dir else {}
+        engines[key] = tesserocr.PyTessBaseAPI(lang=lang, **options)
+    return engines[key]
+
+def warm_ocr_engine() -> None:
+    if ocr_backend() != 'tesserocr':
+        return
+    try:
+        ocr_engine()
+    except Exception as e:
+        print(f"Warning: Could not start the Tesseract engine: {e}")
+
+def _pixmap_to_text(pix, timeout: float | None = None, renders: list | None = None) -> str:
+    if renders is not None:
+        renders.append((pix.width, pix.height))
+    if ocr_backend() == 'tesserocr':
+        engine = ocr_engine()
+        samples = pix.samples
+        engine.SetImageBytes(samples, pix.width, pix.height, pix.n, pix.stride)
+        if not engine.Recognize(int((timeout or 0) * 1000)):
+            raise RuntimeError("Tesseract did not finish recognizing the page")
+        return engine.GetUTF8Text()
+    from PIL import Image
+
+    img = Image.frombytes("L" if pix.n == 1 else "RGB", [pix.width, pix.height], pix.samples)
+    return _pytesseract().image_to_string(img, lang=_ocr_lang(), timeout=timeout or 0)
+
+OCR_ZOOM = 3
+ADAPTIVE_OCR_ZOOM = 2
+CONTENT_SCAN_ZOOM = 0.5
+CONTENT_INK_LEVEL = 160
+CONTENT_MARGIN = 12
+
+def _ocr_page(page, timeout: float | None = None, renders: list | None = None) -> str:
+    import fitz
+
+    pix = page.get_pixmap(matrix=fitz.Matrix(OCR_ZOOM, OCR_ZOOM), alpha=False)
+    return _pixmap_to_text(pix, timeout, renders)
+
+def _content_clip(page):
+    import fitz
+    from PIL import Image
+
+    pix = page.get_pixmap(matrix=fitz.Matrix(CONTENT_SCAN_ZOOM, CONTENT_SCAN_ZOOM), colorspace=fitz.csGRAY, alpha=False)
+    img = Image.frombytes("L", [pix.width, pix.height], pix.samples)
+    bbox = img.point(lambda v: 255 if v < CONTENT_INK_LEVEL else 0).getbbox()
+    if bbox is None:
+        return None
+    x0, y0, x1, y1 = (v / CONTENT_SCAN_ZOOM for v in bbox)
+    clip = fitz.Rect(x0 - CONTENT_MARGIN, y0 - CONTENT_MARGIN, x1 + CONTENT_MARGIN, y1 + CONTENT_MARGIN)
+    return clip & page.rect
+
+def _looks_like_report(text: str) -> bool:
+    return bool(_NATIVE_DATE_RE.search(text) or _NATIVE_TIME_RE.search(text))
+
+def _ocr_page_adaptive(page, timeout: float | None = None, renders: list | None = None) -> str:
+    import fitz
+
+    clip = _content_clip(page)
+    if clip is None or clip.is_empty:
+        return ""
+    pix = page.get_pixmap(matrix=fitz.Matrix(ADAPTIVE_OCR_ZOOM, ADAPTIVE_OCR_ZOOM), colorspace=fitz.csGRAY,
+                          clip=clip, alpha=False)
+    text = _pixmap_to_text(pix, timeout, renders)
+    if _looks_like_report(text):
+        return text
+    return _ocr_page(page, timeout, renders)
+
+def is_pdf_path(source) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+def source_name(source) -> str:
+    if is_pdf_path(source):
+        return os.fspath(source)
+    name = getattr(source, 'name', None)
+    if isinstance(name, str):
+        return name
+    if hasattr(source, '__len__'):
+        return f"<in-memory PDF, {len(source)} bytes>"
+    return "<in-memory PDF>"
+
+def open_pdf(source):
+    import fitz
+
+    if is_pdf_path(source):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+def _share_pdf(data):
+    from multiprocessing import shared_memory
+
+    view = memoryview(data).cast('B')
+    shm = shared_memory.SharedMemory(create=True, size=max(1, view.nbytes))
+    shm.buf[:view.nbytes] = view
+    return shm, view.nbytes
+
+@contextmanager
+def _open_job_pdf(source):
+    if is_pdf_path(source):
+        with open_pdf(source) as doc:
+            yield doc
+        return
+    from multiprocessing import shared_memory
+
+    name, size = source
+    shm = shared_memory.SharedMemory(name=name)
+    view = shm.buf[:size]
+    try:
+        with open_pdf(view) as doc:
+            yield doc
+    finally:
+        view.release()
+        shm.close()
+
+def _ocr_page_worker(source, page_num: int, tesseract_cmd: str, timeout: float | None,
+                     adaptive: bool = False) -> tuple[str | None, float, list]:
+    global _tesseract_cmd
+    _tesseract_cmd = tesseract_cmd
+    with _open_job_pdf(source) as doc:
+        started = time.perf_counter()
+        renders: list = []
+        ocr = _ocr_page_adaptive if adaptive else _ocr_page
+        try:
+            text = ocr(doc.load_page(page_num), timeout, renders)
+        except Exception:
+            text = None
+        return text, time.perf_counter() - started, renders
+
+def _native_checks(native_text: str) -> dict[str, bool]:
+    txt = native_text.strip()
+    return {
+        "date": bool(_NATIVE_DATE_RE.search(txt)),
+        "time": bool(_NATIVE_TIME_RE.search(txt)),
+        "words": sum(1 for _ in islice(_WORD_CHAR_RE.finditer(txt), 21)) > 20,
+    }
+
+def _usable_native_text(native_text: str) -> bool:
+    return any(_native_checks(native_text).values())
+
+def _native_reason(native_text: str) -> str:
+    chars = len(native_text.strip())
+    if not chars:
+        return "no text layer"
+    found = [name for name, hit in _native_checks(native_text).items() if hit]
+    if found:
+        return "text layer has " + ", ".join(found)
+    return "text layer without dates, times or words"
 
 class AttendancePDFReader:
-    def __init__(self, pdf_path):
+    def __init__(self, pdf_path, ocr_workers: int = 1, ocr_timeout: float | None = None, cache=None, metrics=None,
+                 adaptive_ocr: bool = False):
         self.pdf_path = pdf_path
+        self.ocr_workers = max(1, int(ocr_workers or 1))
+        self.ocr_timeout = ocr_timeout
+        self.cache = cache
+        self.metrics = metrics
+        self.adaptive_ocr = adaptive_ocr
+        self._doc = None
+        self._view: memoryview | None = None
+        self._job_source = None
+        self._shared = None
+        self._pool = None
+        self._digest: str | None = None
+        self._page_texts: dict[int, str] = {}
         self._configure_tesseract()
 
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        if hasattr(self, "_pool"):
+            self.close()
+
+    def open(self):
+        if self._doc is None:
+            if is_pdf_path(self.pdf_path):
+                self._doc = open_pdf(self.pdf_path)
+            else:
+                self._view = memoryview(self.pdf_path)
+                self._doc = open_pdf(self._view)
+        return self._doc
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._shared is not None:
+            self._shared.close()
+            self._shared.unlink()
+            self._shared = None
+            self._job_source = None
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+
+    @property
+    def page_count(self) -> int:
+        return len(self.open())
+
     def _configure_tesseract(self):
-        tesseract_cmd = os.getenv('TESSERACT_CMD')
-        
-        if not tesseract_cmd or not os.path.isfile(tesseract_cmd):
-            standard_paths = [
-                '/usr/bin/tesseract',
-                '/usr/local/bin/tesseract',
-                '/opt/homebrew/bin/tesseract',
-            ]
-            for path in standard_paths:
-                if os.path.isfile(path):
-                    tesseract_cmd = path
-                    break
-        
-        if tesseract_cmd and os.path.isfile(tesseract_cmd):
-            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
-            tessdata_dir = os.path.join(os.path.dirname(tesseract_cmd), 'tessdata')
-            if os.path.isdir(tessdata_dir):
-                os.environ['TESSDATA_PREFIX'] = tessdata_dir
+        configure_tesseract()
+
+    def _count(self, name: str, value: int = 1) -> None:
+        if self.metrics is not None:
+            self.metrics.incr(name, value)
+
+    def _record_page(self, page_num: int, branch: str, native_text: str = "", seconds: float | None = None,
+                     renders: list | None = None) -> None:
+        if self.metrics is None or not self.metrics.records_pages:
+            return
+        reason = "page text cache" if branch == "cached" else _native_reason(native_text)
+        self.metrics.record_page(page_num, branch, reason, len(native_text.strip()), seconds, renders)
+
+    def _cache_key(self, page_num: int) -> str:
+        if self._digest is None:
+            if is_pdf_path(self.pdf_path):
+                self._digest = self.cache.file_digest(self.pdf_path)
             else:
-                common_tessdata = [
-                    '/usr/share/tesseract-ocr/5/tessdata',
-                    '/usr/share/tesseract-ocr/4.00/tessdata',
-                    '/usr/local/share/tesseract-ocr/tessdata',
-                ]
-                for td_path in common_tessdata:
-                    if os.path.isdir(td_path):
-                        os.environ['TESSDATA_PREFIX'] = td_path
-                        break
+                self._digest = self.cache.data_digest(self.pdf_path)
+        profile = f"adaptive-{ADAPTIVE_OCR_ZOOM}" if self.adaptive_ocr else OCR_ZOOM
+        backend = ocr_backend()
+        if backend != 'pytesseract':
+            profile = f"{backend}-{profile}"
+        return self.cache.key(self._digest, page_num, _ocr_lang(), profile)
+
+    def _cached_text(self, page_num: int) -> str | None:
+        if page_num in self._page_texts:
+            return self._page_texts[page_num]
+        if self.cache is None:
+            return None
+        text = self.cache.get(self._cache_key(page_num))
+        if text is not None:
+            self._page_texts[page_num] = text
+            self._count("pages_cached")
+            self._record_page(page_num, "cached")
+        return text
+
+    def _store_text(self, page_num: int, text: str, persist: bool = True) -> None:
+        self._page_texts[page_num] = text
+        if persist and self.cache is not None:
+            self.cache.put(self._cache_key(page_num), text)
 
     def _page_text_or_ocr(self, page_num: int) -> str:
-        doc = fitz.open(self.pdf_path)
+        text = self._cached_text(page_num)
+        if text is not None:
+            return text
+        doc = self.open()
         if page_num >= len(doc):
-            doc.close(); return ""
-        page = doc.load_page(page_num)
+            return ""
+        text, ok = self._read_page(doc.load_page(page_num))
+        self._store_text(page_num, text, persist=ok)
+        return text
+
+    def _read_page(self, page) -> tuple[str, bool]:
+        native_text, usable = self._native_text(page)
+        if usable:
+            self._count("pages_native")
+            self._record_page(page.number, "native", native_text)
+            return native_text, True
+        started = time.perf_counter()
+        renders: list = []
+        try:
+            text = (_ocr_page_adaptive if self.adaptive_ocr else _ocr_page)(page, self.ocr_timeout, renders)
+        except Exception:
+            self._count("pages_ocr_failed")
+            self._record_page(page.number, "ocr_failed", native_text, time.perf_counter() - started, renders)
+            return native_text or "", False
+        seconds = time.perf_counter() - started
+        self._count("pages_ocr")
+        self._record_page(page.number, "ocr", native_text, seconds, renders)
+        if self.metrics is not None:
+            self.metrics.observe_ocr(page.number, seconds)
+        return text, True
+
+    @staticmethod
+    def _native_text(page) -> tuple[str, bool]:
         try:
             native_text = page.get_text("text") or ""
         except Exception:
             native_text = ""
-        if native_text:
-            txt = native_text.strip()
-            has_date = re.search(r"\d{1,2}[/-]\d{1,2}[/-]\d{2,4}", txt)
-            has_time = re.search(r"\b\d{1,2}[:.：]\d{2}\b", txt)
-            has_words = len(re.findall(r"\w", txt)) > 20
-            if has_date or has_time or has_words:
-                doc.close()
-                return native_text
-        try:
-            pix = page.get_pixmap(matrix=fitz.Matrix(3, 3), alpha=False)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            lang = 'eng'
-            tessdata_dir = os.getenv('TESSDATA_PREFIX', '')
-            if tessdata_dir and os.path.isdir(tessdata_dir):
-                try:
-                    if 'heb.traineddata' in os.listdir(tessdata_dir):
-                        lang = 'heb+eng'
-                except (OSError, PermissionError):
-                    pass
-            ocr_text = pytesseract.image_to_string(img, lang=lang)
-        except Exception as e:
-            ocr_text = native_text or ""
-        doc.close()
-        return ocr_text
+        return native_text, _usable_native_text(native_text)
+
+    def pages_needing_ocr(self, page_nums=None) -> dict[int, str]:
+        doc = self.open()
+        pending: dict[int, str] = {}
+        for i in (range(len(doc)) if page_nums is None else page_nums):
+            if self._cached_text(i) is not None:
+                continue
+            native_text, usable = self._native_text(doc.load_page(i))
+            if usable:
+                self._count("pages_native")
+                self._record_page(i, "native", native_text)
+                self._store_text(i, native_text)
+            else:
+                pending[i] = native_text
+        return pending
+
+    def store_ocr_result(self, page_num: int, ocr_text: str | None, native_text: str = "",
+                         seconds: float | None = None, renders: list | None = None) -> None:
+        if ocr_text is None:
+            self._count("pages_ocr_failed")
+            self._record_page(page_num, "ocr_failed", native_text, seconds, renders)
+            self._store_text(page_num, native_text or "", persist=False)
+            return
+        self._count("pages_ocr")
+        self._record_page(page_num, "ocr", native_text, seconds, renders)
+        if seconds is not None and self.metrics is not None:
+            self.metrics.observe_ocr(page_num, seconds)
+        self._store_text(page_num, ocr_text)
+
+    def ocr_job(self, page_num: int) -> tuple:
+        if self._job_source is None:
+            if is_pdf_path(self.pdf_path):
+                self._job_source = self.pdf_path
+            else:
+                self._shared, size = _share_pdf(self.pdf_path)
+                self._job_source = (self._shared.name, size)
+        return (_ocr_page_worker, self._job_source, page_num, configure_tesseract(), self.ocr_timeout,
+                self.adaptive_ocr)
+
+    def _ocr_pages_parallel(self, page_nums: list[int]) -> None:
+        pending = self.pages_needing_ocr(page_nums)
+        if len(pending) < 2:
+            return
+
+        pool = self._ocr_pool()
+        futures = {i: pool.submit(*self.ocr_job(i)) for i in pending}
+        for i, fut in futures.items():
+            try:
+                text, seconds, renders = fut.result()
+            except Exception:
+                self.store_ocr_result(i, None, pending[i])
+            else:
+                self.store_ocr_result(i, text, pending[i], seconds, renders)
+
+    def _ocr_pool(self):
+        if self._pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._pool = ProcessPoolExecutor(max_workers=self.ocr_workers)
+        return self._pool
 
     def extract_text_first_page(self) -> str:
+        if self.ocr_workers > 1 and 0 not in self._page_texts:
+            self._ocr_pages_parallel(list(range(self.page_count)))
         return self._page_text_or_ocr(0)
 
     def extract_text_all_pages(self) -> str:
-        doc = fitz.open(self.pdf_path)
-        n = len(doc)
-        doc.close()
+        n = self.page_count
+        if self.ocr_workers > 1:
+            self._ocr_pages_parallel([i for i in range(n) if i not in self._page_texts])
         return "\n".join(self._page_text_or_ocr(i) for i in range(n))
 
+    def extract_words_all_pages(self) -> list[list] | None:
+        doc = self.open()
+        pages = []
+        for i in range(len(doc)):
+            try:
+                words = doc.load_page(i).get_text("words")
+            except Exception:
+                return None
+            if not _usable_native_text(" ".join(w[4] for w in words)):
+                return None
+            pages.append(words)
+        return pages
+
+    def iter_pages(self):
+        n = self.page_count
+        step = self.ocr_workers * 4 if self.ocr_workers > 1 else 1
+        for chunk_start in range(0, n, step):
+            chunk = range(chunk_start, min(n, chunk_start + step))
+            if self.ocr_workers > 1:
+                self._ocr_pages_parallel([i for i in chunk if i not in self._page_texts])
+            for i in chunk:
+                yield self._page_text_or_ocr(i)
+                if i:
+                    self._page_texts.pop(i, None)
+
+_OCR_DIGIT_TABLE = str.maketrans({'O': '0', 'o': '0', 'l': '1', 'I': '1', 'S': '5', 'B': '8'})
+_DATE_RE = re.compile(r'(\d{1,2})[/\-.](\d{1,2})[/\-.](\d{2,4})')
+_NON_TIME_CHARS_RE = re.compile(r"[^0-9:\./\-\s]")
+_TIME_RE = re.compile(r"\b(\d{1,2})[:.：](\d{2})\b")
+_COMPACT_TIME_RE = re.compile(r"(?<![\d/\-])(\d{3,4})(?![\d/\-])")
+
+@lru_cache(maxsize=4096)
+def _iso_date(day: str, month: str, year: str) -> str | None:
+    try:
+        d, m, y = int(day), int(month), int(year)
+        if y < 100: y += 2000
+        return datetime(y, m, d).strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+def match_date(line: str) -> tuple[str, int, int] | None:
+    match = _DATE_RE.search(line)
+    if not match: return None
+    iso = _iso_date(*match.groups())
+    if iso is None: return None
+    return iso, match.start(), match.end()
+
+_CLOCK = {
+    (hs, f"{m:02d}"): f"{h:02d}:{m:02d}"
+    for h in range(24) for hs in {str(h), f"{h:02d}"} for m in range(60)
+}
+_COMPACT_CLOCK = {
+    **{f"{h}{m:02d}": f"{h:02d}:{m:02d}" for h in range(10) for m in range(60)},
+    **{f"{h:02d}{m:02d}": f"{h:02d}:{m:02d}" for h in range(24) for m in range(60)},
+}
+
+def match_times(line: str) -> list[tuple[str, int, int]]:
+    clean = _NON_TIME_CHARS_RE.sub(" ", line.translate(_OCR_DIGIT_TABLE))
+    found: dict[str, tuple[int, int]] = {}
+    for match in _TIME_RE.finditer(clean):
+        formatted = _CLOCK.get(match.groups())
+        if formatted and formatted not in found:
+            found[formatted] = match.span()
+    for match in _COMPACT_TIME_RE.finditer(clean):
+        formatted = _COMPACT_CLOCK.get(match.group(1))
+        if formatted and formatted not in found:
+            found[formatted] = match.span()
+    return [(t, *found[t]) for t in sorted(found)] if found else []
+
+def _longest_run(tokens: list[str]) -> int:
+    if not tokens: return 0
+    best, cur, prev = 1, 1, tokens[0]
+    for t in tokens[1:]:
+        if t == prev:
+            cur += 1
+            best = max(best, cur)
+        else:
+            prev, cur = t, 1
+    return best
+
+def iter_joined_lines(pages):
+    pending = ""
+    for idx, page in enumerate(pages):
+        pending = pending + "\n" + page if idx else page
+        pieces = pending.splitlines(keepends=True)
+        if len(pieces) < 2:
+            continue
+        for piece in pieces[:-1]:
+            yield piece.splitlines()[0]
+        pending = pieces[-1]
+    yield from pending.splitlines()
+
+def _line_spans(text: str, line_indices) -> dict[int, tuple[int, int]]:
+    wanted = set(line_indices)
+    spans: dict[int, tuple[int, int]] = {}
+    pos = 0
+    for i, piece in enumerate(text.splitlines(keepends=True)):
+        if i in wanted:
+            line = piece.splitlines()[0]
+            start = pos + len(line) - len(line.lstrip())
+            spans[i] = (start, max(start, pos + len(line.rstrip())))
+        pos += len(piece)
+    return spans
+
+def _span_hours(start: int, end: int) -> float:
+    if start < 0 or end < 0:
+        return 0.0
+    delta = (end - start) * 60 / 3600
+    if delta < 0:
+        delta += 24
+    return round(delta, 2)
+
+_LAYOUT_HEADERS = {
+    "date": ("תאריך", "date"),
+    "start": ("כניסה", "start", "in"),
+    "end": ("יציאה", "end", "out"),
+    "break": ("הפסקה", "break"),
+    "hours": ("שעות", "hours", "total"),
+}
+_LAYOUT_ROLES = {keyword: role for role, keywords in _LAYOUT_HEADERS.items() for keyword in keywords}
+
+def _layout_rows(words):
+    row: list = []
+    row_mid = 0.0
+    for w in sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0])):
+        mid = (w[1] + w[3]) / 2
+        if row and mid - row_mid > (w[3] - w[1]) / 2:
+            yield sorted(row, key=lambda v: v[0])
+            row = []
+        if not row:
+            row_mid = mid
+        row.append(w)
+    if row:
+        yield sorted(row, key=lambda v: v[0])
+
+def _layout_header(row) -> dict[str, tuple[float, float]]:
+    columns: dict[str, tuple[float, float]] = {}
+    for w in row:
+        role = _LAYOUT_ROLES.get(w[4].strip(':"\'').lower())
+        if role and role not in columns:
+            cell = [v for v in row if v[5:7] == w[5:7]]
+            columns[role] = (min(v[0] for v in cell), max(v[2] for v in cell))
+    return columns if "start" in columns and "end" in columns else {}
+
+def _layout_column(columns: dict[str, tuple[float, float]], x0: float, x1: float) -> str:
+    return min(columns, key=lambda role: max(x0, columns[role][0]) - min(x1, columns[role][1]))
+
+class TextTokens:
+    def __init__(self, text: str | None, dates: list[str | None], times: list, raw_lines: dict[int, str]):
+        self.text = text
+        self.line_count = len(dates)
+        self.dates = dates
+        self.times = times
+        self.raw_lines = raw_lines
+        self.date_positions: list[tuple[int, str]] = [(i, d) for i, d in enumerate(dates) if d]
+        self.times_ordered: list[str] = [t for ts in times for t in ts]
+        self.time_offsets: list[int] = [0, *accumulate(len(ts) for ts in times)]
+        self.longest_time_run = _longest_run(self.times_ordered)
+
+    @property
+    def is_block_mode(self) -> bool:
+        return self.longest_time_run >= max(3, len(self.date_positions) // 3)
+
 class AttendanceTableExtractor:
-    def extract_table_from_text(self, ocr_text: str) -> pd.DataFrame:
-        all_lines = ocr_text.splitlines()
+    def __init__(self):
+        self._last_tokens: TextTokens | None = None
 
-        date_positions: list[tuple[int, str]] = []
-        for i, line in enumerate(all_lines):
+    def tokenize(self, text: str) -> TextTokens:
+        cached = self._last_tokens
+        if cached is not None and cached.text is text:
+            return cached
+        tokens = self.tokenize_lines(text.splitlines(), text)
+        self._last_tokens = tokens
+        return tokens
+
+    def tokenize_lines(self, lines, text: str | None = None) -> TextTokens:
+        dates: list[str | None] = []
+        times: list = []
+        raw_lines: dict[int, str] = {}
+        for i, line in enumerate(lines):
             d = self._find_date(line)
+            dates.append(d)
             if d:
-                date_positions.append((i, d))
-        if not date_positions:
-            return pd.DataFrame(columns=["date", "start", "end", "hours", "raw_line"])
+                raw_lines[i] = line.strip()
+            times.append(self._find_times(line) or ())
+        return TextTokens(text, dates, times, raw_lines)
+
+    def _tokens(self, text: str | TextTokens) -> TextTokens:
+        return text if isinstance(text, TextTokens) else self.tokenize(text)
 
-        times_ordered: list[str] = []
-        for line in all_lines:
-            times = self._find_times(line)
-            if times:
-                times_ordered.extend(times)
-
-        def longest_run(tokens: list[str]) -> int:
-            if not tokens: return 0
-            best, cur, prev = 1, 1, tokens[0]
-            for t in tokens[1:]:
-                if t == prev:
-                    cur += 1
-                    best = max(best, cur)
-                else:
-                    prev, cur = t, 1
-            return best
+    def extract_table_from_text(self, ocr_text: str | TextTokens):
+        records = self.extract_records(ocr_text)
+        if records.empty:
+            import pandas as pd
 
+            return pd.DataFrame(columns=["date", "start", "end", "hours", "raw_line"])
+        return records.to_frame()
+
+    def extract_records(self, ocr_text: str | TextTokens) -> AttendanceRecords:
+        tokens = self._tokens(ocr_text)
+        date_positions = tokens.date_positions
         num_dates = len(date_positions)
-        is_block_mode = longest_run(times_ordered) >= max(3, num_dates // 3)
+        block_mode = bool(num_dates) and tokens.is_block_mode
+        columns = ["date", "start", "end", "break", "hours", "raw_line"] if block_mode else None
+        records = AttendanceRecords(tokens.text, columns)
+        if not num_dates:
+            return records
 
-        rows = []
-        if is_block_mode:
-            starts = times_ordered[:num_dates]
-            ends = times_ordered[num_dates:num_dates * 2]
-            breaks = times_ordered[num_dates * 2:num_dates * 3]
-            while len(starts) < num_dates: starts.append("")
-            while len(ends) < num_dates: ends.append("")
-            while len(breaks) < num_dates: breaks.append("")
+        minutes = [time_minutes(t) for t in tokens.times_ordered]
+        spans = _line_spans(tokens.text, tokens.raw_lines) if tokens.text is not None else None
+
+        def add(line_idx, date_str, start, end, brk=NO_TIME):
+            hours = _span_hours(start, end)
+            if spans is None:
+                records.append(date_ordinal(date_str), start, end, hours, brk, raw_line=tokens.raw_lines[line_idx])
+            else:
+                records.append(date_ordinal(date_str), start, end, hours, brk, raw_span=spans[line_idx])
 
+        if block_mode:
+            padded = minutes[:num_dates * 3] + [NO_TIME] * max(0, num_dates * 3 - len(minutes))
             for idx, (line_idx, date_str) in enumerate(date_positions):
-                start = starts[idx]
-                end = ends[idx]
-                brk = breaks[idx]
-                raw_line = all_lines[line_idx].strip()
-                hours = self._find_hours(raw_line, start, end)
-                rows.append({
-                    "date": date_str,
-                    "start": start,
-                    "end": end,
-                    "break": brk,
-                    "hours": hours,
-                    "raw_line": raw_line,
-                })
-            return pd.DataFrame(rows)
+                add(line_idx, date_str, padded[idx], padded[num_dates + idx], padded[num_dates * 2 + idx])
+            return records
 
+        offsets = tokens.time_offsets
         for idx, (date_line_idx, date_str) in enumerate(date_positions):
-            next_date_idx = date_positions[idx + 1][0] if idx + 1 < num_dates else len(all_lines)
-            window_start = max(0, date_line_idx - 5)
-            window_end = next_date_idx
-            window_times: list[str] = []
-            for i in range(window_start, window_end):
-                ts = self._find_times(all_lines[i])
-                if ts: window_times.extend(ts)
-
-            start = window_times[0] if len(window_times) >= 1 else ""
-            end = window_times[1] if len(window_times) >= 2 else ""
-            raw_line = all_lines[date_line_idx].strip()
-            hours = self._find_hours(raw_line, start, end)
-            rows.append({
-                "date": date_str,
-                "start": start,
-                "end": end,
-                "hours": hours,
-                "raw_line": raw_line,
-            })
-
-        return pd.DataFrame(rows)
+            next_date_idx = date_positions[idx + 1][0] if idx + 1 < num_dates else tokens.line_count
+            first = offsets[max(0, date_line_idx - 5)]
+            count = offsets[next_date_idx] - first
+            add(date_line_idx, date_str,
+                minutes[first] if count >= 1 else NO_TIME,
+                minutes[first + 1] if count >= 2 else NO_TIME)
+        return records
 
-    @staticmethod
-    def _find_date(line: str) -> str | None:
-        match = re.search(r'(\d{1,2})[/\-.](\d{1,2})[/\-.](\d{2,4})', line)
-        if not match: return None
-        try:
-            d, m, y = int(match.group(1)), int(match.group(2)), int(match.group(3))
-            if y < 100: y += 2000
-            return datetime(y, m, d).strftime('%Y-%m-%d')
-        except ValueError:
+    def extract_layout_records(self, pages_words) -> AttendanceRecords | None:
+        records = AttendanceRecords()
+        columns: dict[str, tuple[float, float]] = {}
+        has_break = False
+        timed = 0
+        for words in pages_words:
+            for row in _layout_rows(words):
+                line = " ".join(w[4] for w in row)
+                found = match_date(line)
+                if not found:
+                    header = _layout_header(row)
+                    if header:
+                        columns = header
+                        has_break = has_break or "break" in header
+                    continue
+                if not columns:
+                    return None
+                cells: dict[str, str] = {}
+                for w in row:
+                    if match_date(w[4]):
+                        continue
+                    times = match_times(w[4])
+                    if times:
+                        cells.setdefault(_layout_column(columns, w[0], w[2]), times[0][0])
+                start, end = time_minutes(cells.get("start", "")), time_minutes(cells.get("end", ""))
+                timed += start != NO_TIME or end != NO_TIME
+                records.append(date_ordinal(found[0]), start, end, _span_hours(start, end),
+                               time_minutes(cells.get("break", "")), raw_line=line)
+        if records.empty or timed * 2 < len(records):
             return None
+        if has_break:
+            records.columns = ["date", "start", "end", "break", "hours", "raw_line"]
+        return records
 
     @staticmethod
-    def _find_times(line: str) -> list[str]:
-        line = line.translate(str.maketrans({'O': '0', 'o': '0', 'l': '1', 'I': '1', 'S': '5', 'B': '8'}))
-        clean = re.sub(r"[^0-9:\./\-\s]", " ", line)
-        matches = re.findall(r"\b(\d{1,2})[:.：](\d{2})\b", clean)
-        out = [f"{int(h):02d}:{int(m):02d}" for h, m in matches if 0 <= int(h) <= 23 and 0 <= int(m) <= 59]
-        potential_times = re.findall(r"(?<![\d/\-])(\d{3,4})(?![\d/\-])", clean)
-        for token in potential_times:
-            try:
-                h, m = (int(token[:2]), int(token[2:])) if len(token) == 4 else (int(token[0]), int(token[1:]))
-                if 0 <= h <= 23 and 0 <= m <= 59:
-                    formatted = f"{h:02d}:{m:02d}"
-                    if formatted not in out: out.append(formatted)
-            except ValueError:
-                continue
-        return sorted(list(set(out)))
+    def _find_date(line: str) -> str | None:
+        match = match_date(line)
+        return match[0] if match else None
 
     @staticmethod
-    def _find_hours(line: str, start: str, end: str) -> float:
-        if start and end:
-            try:
-                t0 = datetime.strptime(start, '%H:%M'); t1 = datetime.strptime(end, '%H:%M')
-                delta = (t1 - t0).total_seconds() / 3600
-                if delta < 0: delta += 24
-                return round(delta, 2)
-            except ValueError:
-                return 0.0
-        return 0.0
+    def _find_times(line: str) -> list[str]:
+        return [t for t, _, _ in match_times(line)]
 
     def detect_columns(self, ocr_text: str) -> dict:
         text = (ocr_text or "").replace("\n", " ").lower()
@@ -212,34 +746,15 @@ class AttendanceTableExtractor:
             "has_notes": "הערות" in text or "notes" in text,
         }
 
-    def detect_report_type(self, text: str) -> str:
-        lines = text.splitlines()
-        date_count = 0
-        times_all: list[str] = []
-        for line in lines:
-            if self._find_date(line):
-                date_count += 1
-            ts = self._find_times(line)
-            if ts:
-                times_all.extend(ts)
-
-        def longest_run(tokens: list[str]) -> int:
-            if not tokens:
-                return 0
-            best, cur, prev = 1, 1, tokens[0]
-            for t in tokens[1:]:
-                if t == prev:
-                    cur += 1
-                    best = max(best, cur)
-                else:
-                    prev, cur = t, 1
-            return best
-
-        run = longest_run(times_all)
+    def detect_report_type(self, text: str | TextTokens) -> str:
+        tokens = self._tokens(text)
+        date_count = len(tokens.date_positions)
+        run = tokens.longest_time_run
         if date_count >= 10 and run >= max(3, date_count // 4):
             return 'A'
         return 'B'
 
+@lru_cache(maxsize=None)
 def get_hebrew_font():
     try:
         from reportlab.pdfbase import pdfmetrics
@@ -4,56 +4,159 @@ from reportlab.lib import colors
 from reportlab.lib.units import mm
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import Paragraph
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.lib.enums import TA_RIGHT, TA_LEFT, TA_CENTER
 from bidi.algorithm import get_display
+from functools import lru_cache
+from itertools import chain
 from report_utils import get_hebrew_font
-import pandas as pd
+from records import AttendanceRecords
+import io
+import math
+import re
+import zipfile
+
+_HEBREW_RE = re.compile('[\u0590-\u05FF]')
+
+@lru_cache(maxsize=None)
+def _paragraph_styles(font_name):
+    styles = getSampleStyleSheet()
+    rtl_style = ParagraphStyle(
+        'RTL',
+        parent=styles['Normal'],
+        fontName=font_name,
+        fontSize=10,
+        alignment=TA_RIGHT
+    )
+    ltr_style = ParagraphStyle(
+        'LTR',
+        parent=styles['Normal'],
+        fontName=font_name,
+        fontSize=10,
+        alignment=TA_LEFT
+    )
+    return rtl_style, ltr_style
+
+def _has_hebrew(text):
+    return bool(text) and _HEBREW_RE.search(str(text)) is not None
+
+@lru_cache(maxsize=4096)
+def _rtl_layout(text, font_name, font_size, avail_width):
+    display = " ".join(get_display(text).split())
+    if "<" in display or "&" in display:
+        return None
+    width = stringWidth(display, font_name, font_size)
+    if width > avail_width:
+        return None
+    return display, avail_width - width
+
+@lru_cache(maxsize=4096)
+def _text_width(text, font_name, font_size):
+    return stringWidth(text, font_name, font_size)
+
+def preload_fonts():
+    font_name, _ = get_hebrew_font()
+    return _paragraph_styles(font_name)
 
 class AttendancePDFWriter:
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+
     def write(self, df, report_type, output_path, header_flags):
         if df.empty:
             print("Warning: Received empty data to write. Skipping PDF creation.")
             return
+        self.write_rows(self._rows(df), report_type, output_path, header_flags, df.columns)
+
+    def to_bytes(self, df, report_type, header_flags) -> bytes:
+        buffer = io.BytesIO()
+        self.write(df, report_type, buffer, header_flags)
+        return buffer.getvalue()
+
+    def write_rows(self, rows, report_type, output_path, header_flags, columns_present) -> int:
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            print("Warning: Received empty data to write. Skipping PDF creation.")
+            return 0
 
-        font_name, _ = get_hebrew_font()
         c = canvas.Canvas(output_path, pagesize=A4)
+        written = self._draw_report(c, chain([first], rows), report_type, header_flags, columns_present)
+        c.save()
+        return written
+
+    def write_many(self, reports, output_path) -> int:
+        c = canvas.Canvas(output_path, pagesize=A4)
+        c.setTitle("Attendance variation reports")
+        written = 0
+        for name, df, report_type, header_flags in reports:
+            if df.empty:
+                print(f"Warning: Received empty data for {name}. Skipping it in the bundle.")
+                continue
+            if written:
+                c.showPage()
+            key = f"report-{written}"
+            c.bookmarkPage(key)
+            c.addOutlineEntry(str(name), key, level=0)
+            self._draw_report(c, self._rows(df), report_type, header_flags, df.columns)
+            written += 1
+        if not written:
+            print("Warning: No reports to bundle. Skipping PDF creation.")
+            return 0
+        c.showOutline()
+        c.save()
+        return written
+
+    def write_zip(self, reports, zip_path) -> int:
+        written = 0
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, df, report_type, header_flags in reports:
+                if df.empty:
+                    print(f"Warning: Received empty data for {name}. Skipping it in the archive.")
+                    continue
+                archive.writestr(f"{name}.pdf", self.to_bytes(df, report_type, header_flags))
+                written += 1
+        return written
+
+    @staticmethod
+    def _rows(data):
+        if isinstance(data, AttendanceRecords):
+            return data.iter_rows()
+        return (r for _, r in data.iterrows())
+
+    def _draw_report(self, c, rows, report_type, header_flags, columns_present) -> int:
+        rtl_style, ltr_style = preload_fonts()
         page_w, page_h = A4
         margin = 15 * mm
         title = f"דו\"ח נוכחות חודשי – סוג {report_type}"
         
-        styles = getSampleStyleSheet()
-        rtl_style = ParagraphStyle(
-            'RTL',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=10,
-            alignment=TA_RIGHT
-        )
-        ltr_style = ParagraphStyle(
-            'LTR',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=10,
-            alignment=TA_LEFT
-        )
-        
-        columns = self._get_columns(df, report_type, header_flags)
-        rows = self._build_rows(df, columns)
-        
-        y = self._draw_table_paginated(c, page_w, page_h, margin, title, columns, rows, rtl_style, ltr_style)
-        
-        total_hours = sum(float(r.get("hours", 0.0) or 0.0) for r in rows)
-        work_days = sum(1 for r in rows if (float(r.get("hours", 0.0) or 0.0)) > 0)
+        columns = self._get_columns(columns_present, report_type, header_flags)
+        column_keys = [c[2] for c in columns]
+        totals = {"hours": 0.0, "work_days": 0, "rows": 0}
+
+        def formatted_rows():
+            for r in rows:
+                row_data = self._format_row(r, column_keys)
+                hours = float(row_data.get("hours", 0.0) or 0.0)
+                totals["hours"] += hours
+                totals["work_days"] += 1 if hours > 0 else 0
+                totals["rows"] += 1
+                yield row_data
+
+        first_page = c.getPageNumber()
+        y = self._draw_table(c, page_w, page_h, margin, title, columns, formatted_rows(), rtl_style, ltr_style)
         
-        footer_text = f"סה\"כ שעות: {total_hours:.2f} | ימי עבודה: {work_days}"
+        footer_text = f"סה\"כ שעות: {totals['hours']:.2f} | ימי עבודה: {totals['work_days']}"
         footer_fixed = get_display(footer_text)
         footer_para = Paragraph(footer_fixed, rtl_style)
         footer_para.wrapOn(c, page_w - 2*margin, 20)
         footer_para.drawOn(c, margin, y - 10)
-        
-        c.save()
+        if self.metrics is not None:
+            self.metrics.incr("pages_drawn", c.getPageNumber() - first_page + 1)
+            self.metrics.incr("rows_drawn", totals["rows"])
+        return totals["rows"]
 
-    def _get_columns(self, df, report_type, header_flags):
+    def _get_columns(self, columns_present, report_type, header_flags):
         column_map = {
             "date": ("תאריך", 28*mm, "left"),
             "weekday": ("יום בשבוע", 22*mm, "left"),
@@ -70,7 +173,7 @@ class AttendancePDFWriter:
         output_cols = []
         for key in desired_keys:
             include = False
-            if key in df.columns:
+            if key in columns_present:
                 include = True
             if header_flags and header_flags.get(key, False):
                 include = True
@@ -83,85 +186,97 @@ class AttendancePDFWriter:
                 output_cols.append((header, width, key, align))
         return output_cols
 
-    def _build_rows(self, df, columns):
-        rows = []
-        column_keys = [c[2] for c in columns]
-        for _, r in df.iterrows():
-            row_data = {}
-            for key in column_keys:
-                value = r.get(key, "")
-                row_data[key] = "" if value is None or (isinstance(value, float) and pd.isna(value)) else str(value)
-            rows.append(row_data)
-        return rows
-
-    def _draw_table_paginated(self, c, page_w, page_h, margin, title, col_defs, rows, rtl_style, ltr_style):
-        def has_hebrew(text):
-            if not text:
-                return False
-            for char in str(text):
-                if '\u0590' <= char <= '\u05FF':
-                    return True
-            return False
-        
-        def draw_header(start_y):
-            x = margin
-            y = start_y
-            row_height = 8*mm
-            
-            title_fixed = get_display(title)
-            title_para = Paragraph(title_fixed, rtl_style)
-            title_para.wrapOn(c, page_w - 2*margin, row_height)
-            title_para.drawOn(c, margin, page_h-margin-2)
-            
+    @staticmethod
+    def _format_row(r, column_keys):
+        row_data = {}
+        for key in column_keys:
+            value = r.get(key, "")
+            row_data[key] = "" if value is None or (isinstance(value, float) and math.isnan(value)) else str(value)
+        return row_data
+
+    def _draw_table(self, c, page_w, page_h, margin, title, col_defs, rows, rtl_style, ltr_style):
+        row_height = 8*mm
+        usable_bottom = margin+24
+        table_top = page_h-margin-12*mm
+        table_w = sum(w for _,w,_,_ in col_defs)
+        col_edges = [margin]
+        for _,w,_,_ in col_defs:
+            col_edges.append(col_edges[-1] + w)
+
+        latin_font = c._fontname
+        rtl_font, size = rtl_style.fontName, rtl_style.fontSize
+        rtl_rise = rtl_style.leading - rtl_style.fontSize
+        tx = None
+
+        def draw_paragraph(text, x, y, w, h):
+            para = Paragraph(get_display(text), rtl_style)
+            para.wrapOn(c, w, h)
+            para.drawOn(c, x, y)
+
+        def put_text(x, y, font, text):
+            if tx._fontname != font:
+                tx.setFont(font, size)
+            tx.setTextOrigin(x, y)
+            tx.textOut(text)
+
+        def put_rtl(text, x, y, w, h):
+            layout = _rtl_layout(text, rtl_font, size, w)
+            if layout is None:
+                draw_paragraph(text, x, y, w, h)
+            elif layout[0]:
+                display, indent = layout
+                put_text(x + indent, y + rtl_rise, rtl_font, display)
+
+        def start_page():
+            nonlocal tx
+            tx = c.beginText()
+            tx.setFillColor(colors.black)
+            tx.setFont(latin_font, size)
+            put_rtl(title, margin, page_h-margin-2, page_w - 2*margin, row_height)
+
             c.setFillColor(colors.lightgrey)
-            c.rect(x, y-row_height, sum(w for _,w,_,_ in col_defs), row_height, stroke=0, fill=1)
+            c.rect(margin, table_top-row_height, table_w, row_height, stroke=0, fill=1)
             c.setFillColor(colors.black)
-            cx = x
-            for t,w,align,_ in col_defs:
-                c.rect(cx, y-row_height, w, row_height, stroke=1, fill=0)
-                if has_hebrew(t):
-                    header_fixed = get_display(str(t))
-                    header_para = Paragraph(header_fixed, rtl_style)
-                    header_para.wrapOn(c, w-4, row_height)
-                    header_para.drawOn(c, cx+2, y-row_height+1)
+            for (t,w,_,_), cx in zip(col_defs, col_edges):
+                if _has_hebrew(t):
+                    put_rtl(str(t), cx+2, table_top-row_height+1, w-4, row_height)
                 else:
-                    c.setFont(c._fontname, 10)
-                    c.drawString(cx+2, y-row_height+2, str(t))
-                cx += w
-            return y-row_height
-
-        def draw_text_aligned(x, y, w, text, align):
-            if not text:
-                return
-            text_str = str(text)
-            if has_hebrew(text_str):
-                text_fixed = get_display(text_str)
-                para = Paragraph(text_fixed, rtl_style)
-                para.wrapOn(c, w-4, 8*mm)
-                para.drawOn(c, x+2, y)
-            else:
-                c.setFont(c._fontname, 10)
-                if align == "right":
-                    tw = c.stringWidth(text_str, c._fontname, 10)
-                    c.drawString(x+w-2-tw, y, text_str)
-                else:
-                    c.drawString(x+2, y, text_str)
+                    put_text(cx+2, table_top-row_height+2, latin_font, str(t))
+            return table_top-row_height
 
-        row_height = 8*mm
-        usable_bottom = margin+24
-        y = draw_header(page_h-margin-12*mm)
+        def finish_page(bottom):
+            grid = c.beginPath()
+            grid.rect(margin, bottom, table_w, table_top-bottom)
+            y_line = table_top-row_height
+            while y_line > bottom + 0.01:
+                grid.moveTo(margin, y_line)
+                grid.lineTo(margin+table_w, y_line)
+                y_line -= row_height
+            for x_line in col_edges[1:-1]:
+                grid.moveTo(x_line, table_top)
+                grid.lineTo(x_line, bottom)
+            c.drawPath(grid, stroke=1, fill=0)
+            c.drawText(tx)
 
+        y = start_page()
         for r in rows:
             if y-row_height < usable_bottom:
+                finish_page(y)
                 c.showPage()
-                y = draw_header(page_h-margin-12*mm)
-            
-            cx = margin
-            for _,width,key,align in col_defs:
-                c.rect(cx, y-row_height, width, row_height, stroke=1, fill=0)
+                y = start_page()
+
+            text_y = y-row_height+2
+            for (_,width,key,align), cx in zip(col_defs, col_edges):
                 val = r.get(key, "")
                 text = f"{float(val):.2f}" if (key == "hours" and val) else str(val)
-                draw_text_aligned(cx, y-row_height+2, width, text, align)
-                cx += width
+                if not text:
+                    continue
+                if _has_hebrew(text):
+                    put_rtl(text, cx+2, text_y, width-4, row_height)
+                elif align == "right":
+                    put_text(cx+width-2-_text_width(text, latin_font, size), text_y, latin_font, text)
+                else:
+                    put_text(cx+2, text_y, latin_font, text)
             y -= row_height
+        finish_page(y)
         return y
@@ -1,104 +1,170 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 import hashlib
-import pandas as pd
+from array import array
+import numpy as np
+from records import AttendanceRecords, MINUTES_PER_DAY, time_text
+
+MIN_HOURS = 0.25
+MAX_HOURS = 16
+FIX_MINUTES = 30
+
+_KEPT, _FIXED, _NO_END, _NO_START, _NO_TIMES = range(5)
+_KIND_COUNTERS = ("rows_kept", "rows_fixed", "rows_missing_end", "rows_missing_start", "rows_without_times")
+
+def _map_unique(values, func) -> np.ndarray:
+    import pandas as pd
+
+    codes, uniques = pd.factorize(values)
+    mapped = np.empty(len(uniques) + 1, dtype=object)
+    mapped[:-1] = [func(v) for v in uniques]
+    out = mapped[codes]
+    missing = codes < 0
+    if missing.any():
+        raw = np.asarray(values, dtype=object)
+        out[missing] = [func(v) for v in raw[missing]]
+    return out
+
+def _parse_time(value: str):
+    try:
+        return datetime.strptime(value, "%H:%M")
+    except Exception:
+        return None
+
+def _as_text(value) -> str:
+    return str(value or "")
+
+def _parse_minutes(value: str) -> int:
+    t = _parse_time(value)
+    return t.hour * 60 + t.minute if t else -1
+
+def _clean_hours(value) -> float:
+    value = value or 0.0
+    return float(value) if value and value > 0 else 0.0
+
+def _evaluate(t0: np.ndarray, t1: np.ndarray, hours_kept: np.ndarray):
+    has_start = t0 >= 0
+    has_end = t1 >= 0
+    both = has_start & has_end
+
+    delta = ((t1 - t0) * 60).astype(np.float64) / 3600
+    delta = np.where(delta < 0, delta + 24, delta).round(2)
+    valid = both & (delta >= MIN_HOURS) & (delta <= MAX_HOURS)
+    fixed = both & ~valid
+
+    fixed_minutes = (t0 + FIX_MINUTES) % MINUTES_PER_DAY
+    fixed_hours = round(FIX_MINUTES / 60, 2)
+
+    kind = np.select(
+        [valid, fixed, has_start, has_end],
+        [_KEPT, _FIXED, _NO_END, _NO_START],
+        default=_NO_TIMES,
+    )
+    out_hours = np.select(
+        [valid, fixed, has_start | has_end],
+        [delta, fixed_hours, 0.0],
+        default=hours_kept,
+    )
+    return kind, delta, fixed, fixed_minutes, out_hours
+
+def _log_messages(index, kind, start_at, end_at, fixed_end_at, delta, hours_clean) -> list[str]:
+    messages = {
+        _KEPT: lambda i, k: f"Row {i}: kept {start_at(k)}-{end_at(k)} ({delta[k]:.2f}h)",
+        _FIXED: lambda i, k: f"Row {i}: fixed end to {fixed_end_at(k)} (was {end_at(k)})",
+        _NO_END: lambda i, k: f"Row {i}: missing end; hours set to 0.00",
+        _NO_START: lambda i, k: f"Row {i}: missing start; hours set to 0.00",
+        _NO_TIMES: lambda i, k: f"Row {i}: no times; hours kept {hours_clean[k]:.2f}",
+    }
+    return [messages[c](i, k) for k, (i, c) in enumerate(zip(index, kind.tolist()))]
 
 class AttendanceVariationRules:
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+
+    def _count_kinds(self, counts) -> None:
+        if self.metrics is None:
+            return
+        for name, value in zip(_KIND_COUNTERS, counts):
+            if value:
+                self.metrics.incr(name, int(value))
+
     def apply(self, df, report_type):
+        if isinstance(df, AttendanceRecords):
+            return self.apply_records(df, report_type)
+        import pandas as pd
+
         if df.empty:
             return pd.DataFrame(), []
 
-        def parse_time(value: str):
-            try:
-                return datetime.strptime(value, "%H:%M")
-            except Exception:
-                return None
-
-        def compute_hours(t0: datetime, t1: datetime) -> float:
-            delta = (t1 - t0).total_seconds() / 3600
-            if delta < 0:
-                delta += 24
-            return round(delta, 2)
-
-        new_rows, log = [], []
-        for i, row in df.iterrows():
-            date = row.get("date", "")
-            start = str(row.get("start", "") or "")
-            end = str(row.get("end", "") or "")
-            hours_val = row.get("hours", 0) or 0.0
-
-            t0 = parse_time(start)
-            t1 = parse_time(end)
-
-            if t0 and t1:
-                hours_computed = compute_hours(t0, t1)
-                if 0.25 <= hours_computed <= 16:
-                    new_rows.append({
-                        "date": date,
-                        "start": start,
-                        "end": end,
-                        "hours": round(hours_computed, 2),
-                        "break": row.get("break", ""),
-                        "raw_line": row.get("raw_line", ""),
-                    })
-                    log.append(f"Row {i}: kept {start}-{end} ({hours_computed:.2f}h)")
-                    continue
-                t1_fixed = t0 + timedelta(minutes=30)
-                hours_fixed = compute_hours(t0, t1_fixed)
-                new_rows.append({
-                    "date": date,
-                    "start": start,
-                    "end": t1_fixed.strftime("%H:%M"),
-                    "hours": hours_fixed,
-                    "break": row.get("break", ""),
-                    "raw_line": row.get("raw_line", ""),
-                })
-                log.append(f"Row {i}: fixed end to {t1_fixed.strftime('%H:%M')} (was {end})")
-                continue
-
-            if t0 and not t1:
-                new_rows.append({
-                    "date": date,
-                    "start": start,
-                    "end": end,
-                    "hours": 0.0,
-                    "break": row.get("break", ""),
-                    "raw_line": row.get("raw_line", ""),
-                })
-                log.append(f"Row {i}: missing end; hours set to 0.00")
-                continue
-            if t1 and not t0:
-                new_rows.append({
-                    "date": date,
-                    "start": start,
-                    "end": end,
-                    "hours": 0.0,
-                    "break": row.get("break", ""),
-                    "raw_line": row.get("raw_line", ""),
-                })
-                log.append(f"Row {i}: missing start; hours set to 0.00")
-                continue
-
-            hours_clean = float(hours_val) if hours_val and hours_val > 0 else 0.0
-            new_rows.append({
-                "date": date,
-                "start": start,
-                "end": end,
-                "hours": round(hours_clean, 2),
-                "break": row.get("break", ""),
-                "raw_line": row.get("raw_line", ""),
-            })
-            log.append(f"Row {i}: no times; hours kept {hours_clean:.2f}")
-
-        final_df = pd.DataFrame(new_rows)
-        final_df['weekday'] = final_df['date'].apply(self._hebrew_weekday)
+        n = len(df)
+
+        def column(name):
+            if name in df.columns:
+                return df[name]
+            return pd.Series([""] * n, index=df.index, dtype=object)
+
+        dates = column("date").to_numpy(dtype=object)
+        starts = _map_unique(column("start"), _as_text)
+        ends = _map_unique(column("end"), _as_text)
+        t0 = _map_unique(starts, _parse_minutes).astype(np.int64)
+        t1 = _map_unique(ends, _parse_minutes).astype(np.int64)
+        if "hours" in df.columns:
+            hours_clean = _map_unique(df["hours"], _clean_hours).astype(np.float64)
+            hours_kept = _map_unique(df["hours"], lambda v: round(_clean_hours(v), 2)).astype(np.float64)
+        else:
+            hours_clean = hours_kept = np.zeros(n, dtype=np.float64)
+
+        kind, delta, fixed, fixed_minutes, out_hours = _evaluate(t0, t1, hours_kept)
+        fixed_ends = _map_unique(fixed_minutes, time_text)
+        out_end = np.where(fixed, fixed_ends, ends)
+
+        final_df = pd.DataFrame({
+            "date": dates.tolist(),
+            "start": starts.tolist(),
+            "end": out_end.tolist(),
+            "hours": out_hours,
+            "break": column("break").tolist(),
+            "raw_line": column("raw_line").tolist(),
+        })
+
+        log = _log_messages(df.index, kind, starts.__getitem__, ends.__getitem__, fixed_ends.__getitem__,
+                            delta, hours_clean)
+        self._count_kinds(np.bincount(kind, minlength=len(_KIND_COUNTERS)))
+
+        weekday = _map_unique(final_df['date'], self._hebrew_weekday)
+        final_df['weekday'] = weekday
         if report_type == 'A':
-            final_df['is_sat'] = final_df.apply(
-                lambda r: 'כן' if r['weekday'] == 'שבת' else '',
-                axis=1
-            )
+            final_df['is_sat'] = np.where(weekday == 'שבת', 'כן', '')
 
         return final_df, log
 
+    def apply_records(self, records: AttendanceRecords, report_type):
+        if records.empty:
+            return AttendanceRecords(), []
+
+        t0 = records.minutes("start")
+        t1 = records.minutes("end")
+        hours_in = np.frombuffer(records.hours, dtype=np.float64)
+        hours_clean = np.where(hours_in > 0, hours_in, 0.0)
+        kind, delta, fixed, fixed_minutes, out_hours = _evaluate(t0, t1, hours_clean.round(2))
+        out_end = np.where(fixed, fixed_minutes, t1).astype(np.int16)
+
+        log = _log_messages(range(len(records)), kind, lambda k: time_text(t0[k]), lambda k: time_text(t1[k]),
+                            lambda k: time_text(fixed_minutes[k]), delta, hours_clean)
+        self._count_kinds(np.bincount(kind, minlength=len(_KIND_COUNTERS)))
+
+        return records.derive(
+            self.output_columns(report_type),
+            end=array('h', out_end.tobytes()),
+            hours=array('d', out_hours.astype(np.float64).tobytes()),
+        ), log
+
+    @staticmethod
+    def output_columns(report_type) -> list[str]:
+        columns = ["date", "start", "end", "hours", "break", "raw_line", "weekday"]
+        if report_type == 'A':
+            columns.append("is_sat")
+        return columns
+
     @staticmethod
     def _hebrew_weekday(date_text: str) -> str:
         if not isinstance(date_text, str) or not date_text:
@@ -0,0 +1,164 @@
+import os
+import json
+import base64
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+
+def _warm_worker():
+    import fitz
+    import main
+    import rules
+    from report_utils import configure_tesseract, warm_ocr_engine
+    from report_writer import preload_fonts
+
+    configure_tesseract()
+    preload_fonts()
+    warm_ocr_engine()
+
+def _process_upload(pdf_bytes: bytes, name: str) -> dict:
+    import fitz
+    from main import build_report
+    from report_writer import AttendancePDFWriter
+
+    log: list[str] = []
+    try:
+        report = build_report(pdf_bytes, log=log)
+    except fitz.FileDataError as e:
+        return {"name": name, "status": "invalid", "error": f"not a readable PDF: {e}"}
+
+    if report is None:
+        return {"name": name, "status": "empty", "rows": 0, "log": log}
+    df_var, report_type, header_flags = report
+    pdf = AttendancePDFWriter().to_bytes(df_var, report_type, header_flags)
+    return {
+        "name": name,
+        "status": "ok",
+        "rows": len(df_var),
+        "report_type": report_type,
+        "log": log,
+        "pdf": base64.b64encode(pdf).decode('ascii'),
+    }
+
+class ReportService:
+    def __init__(self, workers: int = 2, max_pending: int | None = None):
+        self.workers = workers
+        self.pool = self._new_pool()
+        self.slots = threading.BoundedSemaphore(max_pending or workers * 2)
+        self._pool_lock = threading.Lock()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+
+    def _restart_pool(self, broken: ProcessPoolExecutor) -> None:
+        with self._pool_lock:
+            if self.pool is not broken:
+                return
+            print("Warning: A worker process died, restarting the worker pool")
+            self.pool = self._new_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, *args):
+        pool = self.pool
+        try:
+            return pool, pool.submit(*args)
+        except BrokenProcessPool:
+            self._restart_pool(pool)
+            pool = self.pool
+            return pool, pool.submit(*args)
+
+    def warm_up(self):
+        for fut in [self.pool.submit(_warm_worker) for _ in range(self.workers)]:
+            fut.result()
+
+    def process(self, pdf_bytes: bytes, name: str, timeout: float | None = None) -> dict | None:
+        if not self.slots.acquire(blocking=False):
+            return None
+        try:
+            pool, fut = self._submit(_process_upload, pdf_bytes, name)
+        except BaseException:
+            self.slots.release()
+            raise
+        fut.add_done_callback(lambda _: self.slots.release())
+        try:
+            return fut.result(timeout=timeout)
+        except BrokenProcessPool:
+            self._restart_pool(pool)
+            raise
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+
+def make_handler(service: ReportService, timeout: float | None):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlparse(self.path).path == '/health':
+                self._send_json(200, {"status": "ok", "workers": service.workers})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != '/process':
+                self._send_json(404, {"error": "not found"})
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            if length <= 0 or length > MAX_UPLOAD_BYTES:
+                self._send_json(400, {"error": f"expected a PDF body of 1..{MAX_UPLOAD_BYTES} bytes"})
+                return
+            name = parse_qs(url.query).get('name', ['report'])[0]
+            pdf_bytes = self.rfile.read(length)
+            try:
+                result = service.process(pdf_bytes, name, timeout)
+            except FutureTimeoutError:
+                self._send_json(504, {"name": name, "status": "timeout", "error": f"not finished within {timeout}s"})
+                return
+            except Exception as e:
+                self._send_json(500, {"name": name, "status": "failed", "error": f"{type(e).__name__}: {e}"})
+                return
+            if result is None:
+                self._send_json(503, {"error": "all workers busy, retry later"})
+                return
+            self._send_json(400 if result["status"] == "invalid" else 200, result)
+
+    return Handler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Attendance variation report service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2,
+                        help="pre-warmed worker processes")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="requests accepted at once before answering 503 (default: 2 x workers)")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="seconds allowed per report")
+    args = parser.parse_args(argv)
+
+    service = ReportService(args.workers, args.max_pending)
+    service.warm_up()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service, args.timeout))
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} warm workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+if __name__ == "__main__":
+    main()
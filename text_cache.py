@@ -0,0 +1,112 @@
+import os
+import hashlib
+import shutil
+
+DEFAULT_CACHE_DIR = os.getenv(
+    'ATTENDANCE_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'attendance-variation', 'pages'),
+)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_process_caches: dict[tuple[str, int], "PageTextCache"] = {}
+
+def _process_cache(cache_dir: str, max_bytes: int) -> "PageTextCache":
+    cache = _process_caches.get((cache_dir, max_bytes))
+    if cache is None:
+        cache = _process_caches[(cache_dir, max_bytes)] = PageTextCache(cache_dir, max_bytes)
+    return cache
+
+class PageTextCache:
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._size: int | None = None
+
+    def __reduce__(self):
+        return _process_cache, (self.cache_dir, self.max_bytes)
+
+    @staticmethod
+    def file_digest(path: str) -> str:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def data_digest(data) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def key(digest: str, page_num: int, lang: str, matrix: float) -> str:
+        raw = f"{digest}:{page_num}:{lang}:{matrix}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + '.txt')
+
+    def get(self, key: str) -> str | None:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                text = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            old_size = os.stat(path).st_size
+        except OSError:
+            old_size = 0
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, 'w', encoding='utf-8', newline='') as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        if self._size is None:
+            self._evict()
+        else:
+            self._size += len(text.encode('utf-8')) - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def clear(self) -> None:
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self._size = 0
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.txt'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            self._size = total
+            return
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+        self._size = total